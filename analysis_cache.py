@@ -0,0 +1,201 @@
+"""Кэш результатов анализа на диске (SQLite).
+
+Ключ — хэш текста вместе с настройками анализатора (см. TextAnalyzer.cache_key),
+поэтому неизменённый документ при повторном открытии не разбирается заново.
+Результат хранится компактно: заголовок JSON (показатели, основы, фразы) и за ним
+числа и позиции байтами array, всё вместе сжато zlib. pickle не используется: файл
+кэша может быть общим, а чтение pickle способно выполнить код. Когда суммарный
+размер записей превышает max_bytes, удаляются давно не использованные.
+"""
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+from array import array
+from instrumentation import metrics
+from text_engine import AnalysisResult, PhraseInfo, WordInfo
+
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # Размер кэша по умолчанию
+CACHE_FORMAT = 5  # Меняется вместе с форматом записи или правилами анализа, старые записи не читаются
+
+# Скалярные поля AnalysisResult; word_info и позиции хранятся отдельно
+_SCALAR_FIELDS = ("char_count", "char_count_no_spaces", "word_count", "text_length", "flesch_index",
+                  "fog_index", "diversity_percentage", "water_percentage", "spam_percentage")
+
+
+def default_cache_path():
+    """Файл кэша в каталоге кэша пользователя; TEXT_ANALYZER_CACHE задаёт другой путь."""
+    path = os.environ.get("TEXT_ANALYZER_CACHE")
+    if path:
+        return path
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "text-analyzer", "analysis.sqlite")
+
+
+def _to_bytes(typecode, values):
+    return array(typecode, values).tobytes()
+
+
+def _from_bytes(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    return values
+
+
+def encode_result(result):
+    """AnalysisResult -> сжатые байты: длина заголовка, заголовок JSON, блоки байтов."""
+    stems = list(result.word_info)
+    infos = result.word_info.values()
+    rows = {stem: row for row, stem in enumerate(stems)}
+    blocks = [
+        _to_bytes("q", (info.count for info in infos)),
+        _to_bytes("q", (info.min_distance for info in infos)),
+        bytes(info.is_stopword for info in infos),
+        # Подсвечиваются только основы из word_info, поэтому храним их номера
+        _to_bytes("i", (rows[stem] for stem in result.highlight_stems)),
+        _to_bytes("i", result.highlight_starts),
+        _to_bytes("i", result.highlight_ends),
+        _to_bytes("i", result.line_starts),
+    ]
+    phrases = None
+    if result.phrases is not None:
+        phrases = [[phrase.text, phrase.stems, phrase.count, phrase.min_distance] for phrase in result.phrases]
+        for phrase in result.phrases:
+            blocks += [phrase.starts.tobytes(), phrase.ends.tobytes()]
+    header = json.dumps({
+        "format": CACHE_FORMAT,
+        "scalars": [getattr(result, name) for name in _SCALAR_FIELDS],
+        "stems": stems,
+        "phrases": phrases,
+        "blocks": [len(block) for block in blocks],
+    }, ensure_ascii=False).encode("utf-8", "surrogatepass")
+    return zlib.compress(b"".join([struct.pack("<I", len(header)), header, *blocks]), 1)
+
+
+def decode_result(data):
+    """Сжатые байты -> AnalysisResult или None, если запись в другом формате."""
+    data = zlib.decompress(data)
+    try:
+        (header_size,) = struct.unpack_from("<I", data)
+        header = json.loads(data[4:4 + header_size].decode("utf-8", "surrogatepass"))
+    except (struct.error, ValueError):
+        return None  # Запись старого формата
+    if not isinstance(header, dict) or header.get("format") != CACHE_FORMAT:
+        return None
+    blocks = []
+    position = 4 + header_size
+    for size in header["blocks"]:
+        blocks.append(data[position:position + size])
+        position += size
+    counts, distances, stop_flags, highlight_rows, starts, ends, line_starts = blocks[:7]
+    stems = header["stems"]
+    scalars = header["scalars"]
+    phrases = header["phrases"]
+    word_info = {
+        stem: WordInfo(count = count, min_distance = min_distance, is_stopword = bool(is_stopword))
+        for stem, count, min_distance, is_stopword
+        in zip(stems, _from_bytes("q", counts), _from_bytes("q", distances), stop_flags)
+    }
+    result = AnalysisResult(word_info = word_info, **dict(zip(_SCALAR_FIELDS, scalars)))
+    result.highlight_stems = [stems[row] for row in _from_bytes("i", highlight_rows)]
+    result.highlight_starts = _from_bytes("i", starts)
+    result.highlight_ends = _from_bytes("i", ends)
+    result.line_starts = _from_bytes("i", line_starts)
+    if phrases is not None:
+        phrase_blocks = blocks[7:]
+        result.phrases = [
+            PhraseInfo(text, tuple(phrase_stems), count, min_distance,
+                       _from_bytes("i", phrase_blocks[2 * i]), _from_bytes("i", phrase_blocks[2 * i + 1]))
+            for i, (text, phrase_stems, count, min_distance) in enumerate(phrases)
+        ]
+    return result
+
+
+class AnalysisCache:
+    """Результаты анализа по ключу в файле SQLite с вытеснением по размеру.
+
+    Ошибки базы (файл занят, диск заполнен) только пишутся в лог: без кэша
+    анализ просто выполняется заново. Одним экземпляром можно пользоваться из
+    разных потоков, а одним файлом — из разных процессов.
+    """
+
+    def __init__(self, path, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+
+    def get(self, key):
+        """AnalysisResult по ключу или None."""
+        with metrics.stage("cache_load"), self.lock:
+            try:
+                row = self.connection.execute("SELECT data FROM results WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                self.connection.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.Error as error:
+                logging.warning("Analysis cache read failed: %s", error)
+                return None
+        try:
+            return decode_result(row[0])
+        except Exception as error:
+            logging.warning("Analysis cache entry is corrupted: %s", error)
+            return None
+
+    def put(self, key, result):
+        """Сохраняет результат и вытесняет старые записи, если кэш стал больше max_bytes."""
+        with metrics.stage("cache_store"):
+            data = encode_result(result)
+            if len(data) > self.max_bytes:
+                return
+            with self.lock:
+                try:
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO results (key, data, size, used) VALUES (?, ?, ?, ?)",
+                        (key, data, len(data), time.time())
+                    )
+                    self.evict()
+                except sqlite3.Error as error:
+                    logging.warning("Analysis cache write failed: %s", error)
+
+    def evict(self):
+        total = self.size()
+        if total <= self.max_bytes:
+            return
+        removed = []
+        for key, size in self.connection.execute("SELECT key, size FROM results ORDER BY used"):
+            if total <= self.max_bytes:
+                break
+            removed.append((key,))
+            total -= size
+        self.connection.executemany("DELETE FROM results WHERE key = ?", removed)
+        metrics.count("cache_evictions", len(removed))
+
+    def size(self):
+        """Суммарный размер записей, байт."""
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def clear(self):
+        with self.lock:
+            try:
+                self.connection.execute("DELETE FROM results")
+                self.connection.execute("VACUUM")
+            except sqlite3.Error as error:
+                logging.warning("Analysis cache clear failed: %s", error)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,289 @@
+"""Локальный HTTP/JSON-сервис анализа текста на asyncio.
+
+    python analysis_server.py --port 8765
+
+POST /analyze  {"text": "...", "positions": false}   -> результат анализа
+POST /batch    {"texts": ["...", ...], "positions": false} -> {"results": [...]}
+GET  /health                                         -> состояние очереди
+
+Результат — те же показатели и повторяющиеся слова, что показывает окно
+(AnalysisResult.to_dict()); с "positions": true добавляются позиции подсветки.
+
+Анализ выполняется в пуле процессов, в каждом из которых NLTK загружен заранее.
+Тексты из одновременных запросов собираются в пакеты, чтобы пересылать их
+процессам реже. Одновременно в пуле не больше max_inflight пакетов, а в очереди —
+не больше max_queue текстов; сверх этого сервис сразу отвечает 503 с Retry-After,
+не накапливая ожидающих запросов.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from text_engine import init_worker, worker_analyzer
+
+logging.basicConfig(level=logging.INFO)
+
+MAX_BODY_BYTES = 64 * 1024 * 1024  # Больше этого тело запроса не читается (413)
+BATCH_MAX_TEXTS = 16               # Сколько текстов уходит процессу за раз
+BATCH_MAX_CHARS = 256 * 1024       # ... или сколько символов, что наступит раньше
+BATCH_DELAY = 0.002                # Сколько секунд ждать попутчиков для пакета
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+def warm_up_worker():
+    return os.getpid()
+
+
+def result_to_json(result, positions=False):
+    record = result.to_dict()
+    if positions:
+        for name in ("highlight_stems", "highlight_starts", "highlight_ends", "line_starts"):
+            record[name] = list(getattr(result, name))
+    return record
+
+
+def analyze_batch(texts, positions):
+    """Выполняется в процессе пула: список записей JSON или {"error": ...} по каждому тексту."""
+    analyzer = worker_analyzer()
+    records = []
+    for text in texts:
+        try:
+            records.append(result_to_json(analyzer.analyze(text), positions))
+        except Exception as error:
+            logging.exception("Analysis failed")
+            records.append({"error": str(error)})
+    return records
+
+
+class ServiceBusy(Exception):
+    """Очередь заполнена, запрос нужно повторить позже."""
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AnalysisService:
+    def __init__(self, jobs=None, max_inflight=None, max_queue=256, cache_path=None, tokenizer="punkt"):
+        self.jobs = jobs or os.cpu_count()
+        self.max_inflight = max_inflight or self.jobs * 2
+        self.cache_path = cache_path
+        self.tokenizer = tokenizer
+        self.queue = asyncio.Queue(maxsize=max_queue)  # (текст, positions, future)
+        self.inflight = asyncio.Semaphore(self.max_inflight)
+        self.pool = None
+        self.dispatcher = None
+        self.carry = None  # Текст, не подошедший к прошлому пакету
+        self.batches = set()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.pool = ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker,
+                                        initargs=("russian", self.cache_path, None, self.tokenizer))
+        # Процессы создаются и загружают NLTK до первого запроса
+        pids = await asyncio.gather(*(loop.run_in_executor(self.pool, warm_up_worker) for _ in range(self.jobs)))
+        logging.info("Workers ready: %d", len(set(pids)))
+        self.dispatcher = asyncio.create_task(self.dispatch())
+
+    async def stop(self):
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    async def analyze(self, texts, positions=False):
+        """Записи результатов для texts; ServiceBusy, если все тексты не помещаются в очередь."""
+        if self.queue.qsize() + len(texts) > self.queue.maxsize:
+            raise ServiceBusy()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self.queue.put_nowait((text, positions, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Ждём, пока в пуле освободится место: до тех пор очередь только растёт
+            await self.inflight.acquire()
+            if self.carry is not None:
+                batch = [self.carry]
+                self.carry = None
+            else:
+                batch = [await self.queue.get()]
+            positions = batch[0][1]
+            chars = len(batch[0][0])
+            deadline = loop.time() + BATCH_DELAY
+            while len(batch) < BATCH_MAX_TEXTS and chars < BATCH_MAX_CHARS:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item[1] != positions:
+                    # Пакет обрабатывается с одним значением positions; текст пойдёт следующим пакетом
+                    self.carry = item
+                    break
+                batch.append(item)
+                chars += len(item[0])
+            task = asyncio.create_task(self.run_batch(batch, positions))
+            self.batches.add(task)
+            task.add_done_callback(self.batches.discard)
+
+    async def run_batch(self, batch, positions):
+        loop = asyncio.get_running_loop()
+        try:
+            records = await loop.run_in_executor(self.pool, analyze_batch, [text for text, _, _ in batch], positions)
+        except Exception as error:
+            records = [{"error": str(error)}] * len(batch)
+        finally:
+            self.inflight.release()
+        for (_, _, future), record in zip(batch, records):
+            if not future.done():
+                future.set_result(record)
+
+    def health(self):
+        return {"status": "ok", "workers": self.jobs, "queued": self.queue.qsize(),
+                "max_queue": self.queue.maxsize, "max_inflight": self.max_inflight}
+
+
+async def read_request(reader):
+    """(метод, путь, заголовки, тело) или None, если клиент закрыл соединение."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HttpError(400, "invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "request body is too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+def write_response(writer, status, payload, keep_alive=True, extra_headers=()):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = [f"HTTP/1.1 {status} {_REASONS[status]}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            "Connection: " + ("keep-alive" if keep_alive else "close"),
+            *extra_headers]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+
+def parse_json(body):
+    try:
+        return json.loads(body)
+    except ValueError as error:
+        raise HttpError(400, f"invalid JSON: {error}")
+
+
+async def route(service, method, path, body):
+    if path == "/health":
+        if method != "GET":
+            raise HttpError(405, "use GET")
+        return service.health()
+    if path not in ("/analyze", "/batch"):
+        raise HttpError(404, "unknown path")
+    if method != "POST":
+        raise HttpError(405, "use POST")
+    request = parse_json(body)
+    if not isinstance(request, dict):
+        raise HttpError(400, "expected a JSON object")
+    positions = bool(request.get("positions", False))
+    if path == "/analyze":
+        text = request.get("text")
+        if not isinstance(text, str):
+            raise HttpError(400, "\"text\" must be a string")
+        record = (await service.analyze([text], positions))[0]
+        if "error" in record:
+            raise HttpError(500, record["error"])
+        return record
+    texts = request.get("texts")
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        raise HttpError(400, "\"texts\" must be a list of strings")
+    if len(texts) > service.queue.maxsize:
+        raise HttpError(413, f"at most {service.queue.maxsize} texts per request")
+    return {"results": await service.analyze(texts, positions)}
+
+
+async def handle_connection(service, reader, writer):
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                write_response(writer, 200, await route(service, method, path, body), keep_alive)
+            except ServiceBusy:
+                keep_alive = True
+                write_response(writer, 503, {"error": "queue is full, retry later"}, extra_headers=("Retry-After: 1",))
+            except HttpError as error:
+                # Тело запроса могло остаться непрочитанным, поэтому соединение закрываем
+                keep_alive = False
+                write_response(writer, error.status, {"error": str(error)}, keep_alive=False)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, service):
+    await service.start()
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(service, reader, writer), host, port)
+    logging.info("Listening on http://%s:%d", host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальный HTTP/JSON-сервис анализа текста.")
+    parser.add_argument("--host", default="127.0.0.1", help="адрес (по умолчанию только локальный)")
+    parser.add_argument("--port", type=int, default=8765, help="порт (по умолчанию 8765)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="число процессов анализа (по умолчанию все ядра)")
+    parser.add_argument("--max-inflight", type=int, help="сколько пакетов одновременно в пуле (по умолчанию 2 на процесс)")
+    parser.add_argument("--max-queue", type=int, default=256, help="сколько текстов ждут в очереди, дальше ответ 503")
+    parser.add_argument("--cache", metavar="PATH", help="файл кэша результатов SQLite")
+    parser.add_argument("--tokenizer", choices=["punkt", "regex"], default="punkt", help="токенизатор: punkt (NLTK, по умолчанию) или regex (быстрее)")
+    args = parser.parse_args(argv)
+
+    service = AnalysisService(args.jobs, args.max_inflight, args.max_queue, args.cache, args.tokenizer)
+    try:
+        asyncio.run(serve(args.host, args.port, service))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from text_engine import init_worker, worker_analyzer
+
+logging.basicConfig(level=logging.INFO)
+
+def analyze_file(path, encoding="utf-8", stream=False):
+    """Анализирует один файл и возвращает запись для JSONL."""
+    try:
+        if stream:
+            result = worker_analyzer().analyze_file(path, encoding)
+        else:
+            result = worker_analyzer().analyze(Path(path).read_text(encoding=encoding))
+    except (OSError, UnicodeDecodeError) as error:
+        return {"file": str(path), "error": str(error)}
+    return {"file": str(path), **result.to_dict()}
+
+
+def iter_files(directory, pattern):
+    for path in sorted(Path(directory).rglob(pattern)):
+        if path.is_file():
+            yield path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный анализ текстовых файлов каталога.")
+    parser.add_argument("directory", help="каталог с текстами")
+    parser.add_argument("-o", "--output", default="-", help="файл результатов JSONL (по умолчанию stdout)")
+    parser.add_argument("-p", "--pattern", default="*.txt", help="шаблон имён файлов (по умолчанию *.txt)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="число процессов (по умолчанию все ядра)")
+    parser.add_argument("--encoding", default="utf-8", help="кодировка файлов")
+    parser.add_argument("--stream", action="store_true", help="читать файлы кусками через mmap (для очень больших файлов)")
+    parser.add_argument("--cache", metavar="PATH", help="файл кэша результатов SQLite (без --stream); неизменённые файлы не анализируются заново")
+    parser.add_argument("--cache-size", type=int, default=256, metavar="MB", help="предельный размер кэша, МБ (по умолчанию 256)")
+    parser.add_argument("--tokenizer", choices=["punkt", "regex"], default="punkt", help="токенизатор: punkt (NLTK, по умолчанию) или regex (быстрее)")
+    args = parser.parse_args(argv)
+
+    files = list(iter_files(args.directory, args.pattern))
+    logging.info("Files to analyze: %d, workers: %d", len(files), args.jobs)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker,
+                                 initargs=("russian", args.cache, args.cache_size * 1024 * 1024, args.tokenizer)) as pool:
+            encodings = [args.encoding] * len(files)
+            streams = [args.stream] * len(files)
+            # Порядок записей совпадает с порядком файлов
+            for record in pool.map(analyze_file, files, encodings, streams, chunksize=max(1, len(files) // (args.jobs * 4))):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+"""Замеры производительности анализатора.
+
+Запуск: python benchmark.py frequency
+        python benchmark.py startup
+        python benchmark.py readability
+        python benchmark.py suite --text-sizes 1K 1M --save baseline.json
+        python benchmark.py suite --compare baseline.json
+        python benchmark.py memory --text-sizes 1M 10M
+        python benchmark.py tokenizers --corpus path/to/texts
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from readability import count_readability, count_syllables, is_hard_word, score_documents
+from text_engine import count_stems, tokenize
+
+SYLLABLES = ["ма", "ра", "ко", "ли", "не", "сто", "пра", "ве", "ду", "ша", "ни", "го", "ры", "да", "мо", "ло", "ке", "ты"]
+
+
+def generate_words(num_words, vocabulary_size=20000, seed=0):
+    """Детерминированный поток «основ» с распределением Ципфа, как в живом тексте."""
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 5))) for _ in range(vocabulary_size)]
+    weights = [1 / rank for rank in range(1, vocabulary_size + 1)]
+    return rng.choices(vocabulary, weights, k=num_words)
+
+
+# Словарь генератора: частые слова русского текста, окончания для словоформ и стоп-слова
+COMMON_STEMS = (
+    "врем человек год дел жизн ден рук работ слов мест лиц друг глаз вопрос дом сторон стран мир случа "
+    "голов сил конц вид систем част город отношени женщин деньг земл машин вод отц проблем час прав ног "
+    "решени двер образ истори власт закон войн голос тысяч книг возможност результат ноч стол им област "
+    "стать числ компани народ жен групп развити процесс суд услови средств начал свет пут душ уровн форм "
+    "связ минут улиц вечер качеств мысл дорог матер действи месяц государств язык любов взгляд школ цел "
+    "обществ деятельност организаци президент комнат порядк момент театр письм утр помощ ситуаци рол "
+    "смысл состояни квартир орган внимани тел труд сын мер смерт рынк программ задач предприяти окн "
+    "разговор правительств семь производств информаци положени центр ответ муж автор стен интерес "
+    "федераци правил управлени мужчин иде парти"
+).split()
+ENDINGS = ("", "а", "у", "ом", "е", "ы", "ами", "ах", "ой", "ия", "ого", "ыми")
+STOP_WORDS = (
+    "и в не на я что он с как а то все она так его но к у же вы за бы по только ее мне было вот от меня "
+    "еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас опять уж вам ведь "
+    "там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам без будто чего "
+    "раз тоже себе под будет тогда кто этот того потому этого какой совсем ним здесь этом один почти мой "
+    "тем чтобы сейчас были куда зачем всех никогда можно при наконец два об другой хоть после над больше "
+    "тот через эти нас про всего них какая много разве три эту моя хорошо свою этой перед иногда лучше"
+).split()
+TEXT_SIZES = ["1K", "100K", "1M", "10M", "50M"]
+# Трудные для делителя на предложения места: инициалы, сокращения, прямая речь, нумерация
+TOKENIZER_SAMPLE = (
+    "А. С. Пушкин родился в 1799 г. в Москве. Он писал стихи, т. е. много писал. Т. е. всё.\n"
+    "— Привет! — сказал он. — Как дела?\n"
+    "«Кто там?» — спросила она. Цена 5 руб. за штуку. Купил.\n"
+    "Что?! Да... Нет… Может быть. 1. Пункт первый. 2) Второй пункт.\n"
+    "См. рис. 5. Итого. И т. д. Далее по тексту, кое-как и -- как-нибудь. Это был я. Потом ушёл.\n"
+)
+
+
+def parse_size(size):
+    """Размер вида 1K, 10M или 500 (байты)."""
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    size = size.upper()
+    if size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def generate_text(size, seed=0):
+    """Детерминированный русский текст около size байт в UTF-8.
+
+    Словоформы распределены по Ципфу; предложения по 4–20 слов с заглавной буквой и
+    знаком в конце, абзацы по 3–8 предложений на отдельных строках.
+    """
+    rng = random.Random(seed)
+    vocabulary = [stem + ending for stem in COMMON_STEMS for ending in ENDINGS]
+    # Длинный хвост редких слов
+    vocabulary += ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 6))) for _ in range(20000)]
+    rng.shuffle(vocabulary)
+    vocabulary = STOP_WORDS + vocabulary
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+
+    paragraphs = []
+    written = 0
+    words = iter(())
+    while written < size:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            sentence = []
+            for _ in range(rng.randint(4, 20)):
+                word = next(words, None)
+                if word is None:
+                    words = iter(rng.choices(vocabulary, cum_weights=cum_weights, k=10000))
+                    word = next(words)
+                sentence.append(word)
+            if rng.random() < 0.3:
+                sentence[rng.randrange(len(sentence) - 1)] += ","
+            sentence = " ".join(sentence)
+            sentences.append(sentence[0].upper() + sentence[1:] + rng.choice(".....!?"))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        written += len(paragraph.encode("utf-8")) + 1
+    return "\n".join(paragraphs) + "\n"
+
+
+class TextStub:
+    """Заменяет tk.Text, когда нет дисплея: вместо вызовов Tk считает их."""
+
+    def __init__(self, visible_lines=40):
+        self.visible_lines = visible_lines
+        self.calls = Counter()
+
+    def index(self, index):
+        return "1.0" if index == "@0,0" else f"{self.visible_lines}.0"
+
+    def winfo_height(self):
+        return 0
+
+    def tag_add(self, tag, *indexes):
+        self.calls["tag_add"] += 1
+
+    def tag_config(self, tag, **options):
+        self.calls["tag_config"] += 1
+
+    def tag_delete(self, *tags):
+        self.calls["tag_delete"] += 1
+
+
+def make_highlighter(text, result):
+    """Логика подсветки из окна без самого окна: на настоящем tk.Text, если есть дисплей, иначе на TextStub.
+
+    Возвращает (tag_visible, close); close() уничтожает скрытый корень Tk.
+    """
+    # Tk нужен только здесь: load_test.py берёт из этого модуля генератор текста и
+    # должен работать и на Python без tkinter
+    import tkinter as tk
+    from text_analyzer import DuplicateWordFinder, HighlightMode
+
+    app = DuplicateWordFinder.__new__(DuplicateWordFinder)  # __init__ не вызываем, окно не создаётся
+    root = None
+    try:
+        root = tk.Tk()
+        root.withdraw()
+        app.input_text = tk.Text(root, width=100, height=40)
+        app.input_text.insert("1.0", text)
+    except tk.TclError:
+        app.input_text = TextStub()
+    frames = []
+    app.after = lambda ms, func: frames.append(func)
+    app.after_cancel = lambda job: None
+    app.highlight_mode = HighlightMode(repeat_word = True, stop_word = True)
+    app.word_info = result.word_info
+    app.text_length = result.text_length
+    app.highlight_stems = result.highlight_stems
+    app.highlight_starts = result.highlight_starts
+    app.highlight_ends = result.highlight_ends
+    app.line_starts = result.line_starts
+    app.text_size = result.char_count
+    app.highlight_range = None
+    app.highlight_tags = {}
+    app.pending_highlights = []
+    app.highlight_stale = False
+    app.selected_word = ""
+    app.selected_phrase = None
+    app.highlight_batch_job = None
+    app.update_status = lambda: None
+
+    def tag_visible():
+        app.highlight_range = None
+        app.refresh_highlight()
+        while frames:
+            frames.pop(0)()
+        return len(app.highlight_tags)
+
+    def close():
+        if root is not None:
+            root.destroy()
+    return tag_visible, close
+
+
+def measure(func, setup=None, repeat=1):
+    """Лучшее время из repeat запусков и пик памяти (tracemalloc) отдельного запуска."""
+    best = float("inf")
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    if setup:
+        setup()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def run_suite(size, seed=0):
+    """Время и пик памяти каждого этапа анализа на сгенерированном тексте размера size байт."""
+    from text_engine import TextAnalyzer, merge_stem_stats, preprocess_text
+    from analysis_cache import AnalysisCache
+    from word_list import SORT_KEYS, SortedWords
+
+    text = generate_text(size, seed)
+    analyzer = TextAnalyzer("russian")
+    paragraphs = text.split("\n")
+    repeat = 5 if size <= 1 << 20 else 1
+
+    stages = {}
+    def stage(name, func, setup=None):
+        seconds, peak, result = measure(func, setup, repeat)
+        stages[name] = {"seconds": seconds, "peak_mb": peak / 1e6}
+        return result
+
+    def frequency():
+        word_stats = {}
+        offset = 0
+        for stemmed_words in stemmed:
+            merge_stem_stats(word_stats, count_stems(stemmed_words), offset)
+            offset += len(stemmed_words)
+        return word_stats
+
+    stage("preprocess", lambda: [preprocess_text(paragraph) for paragraph in paragraphs])
+    tokens = stage("tokenize", lambda: [tokenize(paragraph) for paragraph in paragraphs])
+    stage("tokenize_re", lambda: [tokenize(paragraph, tokenizer="regex") for paragraph in paragraphs])
+    stemmed = stage("stem", lambda: [[analyzer.stem(word) for word in paragraph.words] for paragraph in tokens],
+                    setup=analyzer.stem.cache_clear)
+    stage("frequency", frequency)
+    stage("readability", lambda: [count_readability(paragraph.words) for paragraph in tokens])
+    result = stage("analyze", lambda: analyzer.analyze(text), setup=analyzer.stem.cache_clear)
+    tag_visible, close_highlighter = make_highlighter(text, result)
+    stage("ui_tagging", tag_visible)
+    close_highlighter()
+    stage("word_list", lambda: [SortedWords(result.word_info, key).rows(0, 40) for key in SORT_KEYS.values()])
+    with tempfile.TemporaryDirectory() as directory:
+        analyzer.cache = AnalysisCache(os.path.join(directory, "cache.sqlite"))
+        stage("cache_store", lambda: analyzer.cache.put(analyzer.cache_key(text), result))
+        stage("cache_hit", lambda: analyzer.analyze(text))
+        analyzer.cache.close()
+    return {"bytes": len(text.encode("utf-8")), "words": result.word_count, "stages": stages}
+
+
+def bench_suite(sizes, save=None, compare=None, seed=0):
+    baseline = {}
+    if compare:
+        with open(compare, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+    results = {}
+    for size in sizes:
+        results[size] = run = run_suite(parse_size(size), seed)
+        print(f"\n{size}: {run['bytes']} байт, {run['words']} слов")
+        print(f"{'этап':<12} {'время, с':>10} {'пик, МБ':>9} {'к базе':>8}")
+        for name, values in run["stages"].items():
+            base = baseline.get(size, {}).get("stages", {}).get(name)
+            ratio = f"{values['seconds'] / base['seconds']:.2f}x" if base and base["seconds"] else "-"
+            print(f"{name:<12} {values['seconds']:>10.4f} {values['peak_mb']:>9.2f} {ratio:>8}")
+    if save:
+        with open(save, "w", encoding="utf-8") as file:
+            json.dump({"python": sys.version, "seed": seed, "results": results}, file, indent=2)
+
+
+def best_time(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_frequency(sizes):
+    """Частоты и минимальные расстояния: время на слово должно оставаться постоянным."""
+    print(f"{'слов':>10} {'время, с':>10} {'нс/слово':>10}")
+    for size in sizes:
+        words = generate_words(size)
+        elapsed = best_time(count_stems, words)
+        print(f"{size:>10} {elapsed:>10.4f} {elapsed / size * 1e9:>10.1f}")
+
+
+def bench_readability(sizes):
+    """Слоги и трудные слова: цикл по словам против подсчёта сразу по массиву."""
+    def per_word(words):
+        return sum(count_syllables(word) for word in words), sum(1 for word in words if is_hard_word(word))
+
+    print(f"{'слов':>10} {'по словам, с':>14} {'массивом, с':>12} {'100 док., с':>12}")
+    for size in sizes:
+        words = generate_words(size)
+        documents = [(size // 1500 + 1, words[i::100]) for i in range(100)]
+        print(f"{size:>10} {best_time(per_word, words):>14.4f} {best_time(count_readability, words):>12.4f} "
+              f"{best_time(score_documents, documents):>12.4f}")
+
+
+@dataclass
+class ListWordInfo:
+    count: int
+    min_distance: int
+    is_stopword: bool
+
+
+def list_structures(analyzer, result):
+    """Данные анализа в прежнем виде: списки str и int, WordInfo без __slots__, статистика словарём списков."""
+    stems = analyzer.stem_table.stems
+    paragraphs = []
+    for paragraph in analyzer.paragraph_cache.values():
+        tokens = paragraph.tokens
+        paragraphs.append((
+            [(" " + word)[1:] for word in tokens.words],  # как после среза: отдельная строка на каждое слово
+            list(tokens.starts),
+            list(tokens.ends),
+            list(tokens.sentence_starts),
+            [stems[stem_id] for stem_id in paragraph.stem_ids],
+            {stems[stem_id]: list(stats) for stem_id, stats in paragraph.word_stats.items()},
+        ))
+    word_info = {stem: ListWordInfo(info.count, info.min_distance, info.is_stopword) for stem, info in result.word_info.items()}
+    positions = [list(result.highlight_stems), list(result.highlight_starts), list(result.highlight_ends), list(result.line_starts)]
+    return paragraphs, word_info, positions
+
+
+def bench_memory(sizes, seed=0):
+    """Сколько памяти держат результат и кэш абзацев: компактные буферы против списков."""
+    from text_engine import TextAnalyzer
+
+    print(f"{'размер':>8} {'слов':>10} {'массивы, МБ':>12} {'списки, МБ':>11} {'Б/слово':>9} {'было':>6}")
+    for size in sizes:
+        text = generate_text(parse_size(size), seed)
+        analyzer = TextAnalyzer("russian", incremental=True)
+        gc.collect()
+        tracemalloc.start()
+        result = analyzer.analyze(text)
+        gc.collect()
+        compact = tracemalloc.get_traced_memory()[0]
+        lists = list_structures(analyzer, result)
+        gc.collect()
+        listed = tracemalloc.get_traced_memory()[0] - compact
+        tracemalloc.stop()
+        del lists
+        words = max(1, result.word_count)
+        print(f"{size:>8} {result.word_count:>10} {compact / 1e6:>12.1f} {listed / 1e6:>11.1f} "
+              f"{compact / words:>9.0f} {listed / words:>6.0f}")
+
+
+def load_corpus(paths):
+    """(имя, текст) для каждого файла из paths; из каталогов берутся все *.txt."""
+    documents = []
+    for path in map(Path, paths):
+        for file in sorted(path.rglob("*.txt")) if path.is_dir() else [path]:
+            documents.append((str(file), file.read_text(encoding="utf-8")))
+    return documents
+
+
+def compare_tokenizers(text, analyzers):
+    """Строки таблицы сравнения токенизаторов на тексте: (показатель, punkt, regex).
+
+    Кроме показателей анализа считается, сколько границ слов и предложений не совпало
+    и у скольких основ другие частота или минимальное расстояние.
+    """
+    paragraphs = text.split("\n")
+    streams = {name: [tokenize(paragraph, tokenizer=name) for paragraph in paragraphs] for name in analyzers}
+    word_mismatches = sentence_mismatches = 0
+    for reference, candidate in zip(streams["punkt"], streams["regex"]):
+        word_mismatches += len(set(zip(reference.starts, reference.ends)) ^ set(zip(candidate.starts, candidate.ends)))
+        sentence_mismatches += len(set(reference.sentence_starts) ^ set(candidate.sentence_starts))
+
+    results = {}
+    seconds = {}
+    for name, analyzer in analyzers.items():
+        analyzer.stem.cache_clear()
+        start = time.perf_counter()
+        results[name] = analyzer.analyze(text)
+        seconds[name] = time.perf_counter() - start
+    reference, candidate = results["punkt"], results["regex"]
+    stems = reference.word_info.keys() | candidate.word_info.keys()
+    changed_stems = sum(1 for stem in stems if reference.word_info.get(stem) != candidate.word_info.get(stem))
+
+    rows = [("слов", reference.word_count, candidate.word_count),
+            ("предложений", *(sum(stream.sentence_count for stream in streams[name]) for name in ("punkt", "regex")))]
+    for name, attribute in (("удобочитаемость", "flesch_index"), ("туманность", "fog_index"),
+                            ("разнообразие, %", "diversity_percentage"), ("вода, %", "water_percentage"),
+                            ("заспамленность, %", "spam_percentage")):
+        rows.append((name, getattr(reference, attribute), getattr(candidate, attribute)))
+    rows.append(("повторов фраз", len(reference.phrases), len(candidate.phrases)))
+    rows.append(("токенизация, с", *(best_time(lambda: [tokenize(paragraph, tokenizer=name) for paragraph in paragraphs])
+                                      for name in ("punkt", "regex"))))
+    rows.append(("анализ, с", seconds["punkt"], seconds["regex"]))
+    mismatches = (word_mismatches, sentence_mismatches, changed_stems, len(stems))
+    return rows, mismatches
+
+
+def bench_tokenizers(sizes, corpus=None, seed=0):
+    """Токенизатор regex против эталонного punkt: расхождения показателей и скорость.
+
+    Без corpus сравнение идёт на TOKENIZER_SAMPLE и сгенерированном тексте размеров sizes.
+    """
+    from text_engine import TextAnalyzer
+
+    if corpus:
+        documents = load_corpus(corpus)
+    else:
+        documents = [("образец", TOKENIZER_SAMPLE)] + [(size, generate_text(parse_size(size), seed)) for size in sizes]
+    analyzers = {name: TextAnalyzer("russian", tokenizer=name) for name in ("punkt", "regex")}
+    for name, text in documents:
+        rows, (word_mismatches, sentence_mismatches, changed_stems, stems) = compare_tokenizers(text, analyzers)
+        print(f"\n{name}: {len(text.encode('utf-8'))} байт")
+        print(f"{'показатель':<18} {'punkt':>10} {'regex':>10} {'разница':>9}")
+        for label, reference, candidate in rows:
+            if label.endswith(", с"):
+                change = f"{reference / candidate:.1f}x" if candidate else "-"
+                print(f"{label:<18} {reference:>10.4f} {candidate:>10.4f} {change:>9}")
+            elif isinstance(reference, int):
+                print(f"{label:<18} {reference:>10} {candidate:>10} {candidate - reference:>+9}")
+            else:
+                print(f"{label:<18} {reference:>10.2f} {candidate:>10.2f} {candidate - reference:>+9.2f}")
+        print(f"не совпало границ слов: {word_mismatches}, начал предложений: {sentence_mismatches}, "
+              f"основ с другой частотой или расстоянием: {changed_stems} из {stems}")
+
+
+def bench_startup(repeat=5):
+    """Время запуска в новом процессе: импорт модулей и первая загрузка NLTK."""
+    cases = [
+        ("python", "pass"),
+        ("import text_engine", "import text_engine"),
+        ("import text_analyzer", "import text_analyzer"),
+        ("TextAnalyzer()", "import text_engine; text_engine.TextAnalyzer()"),
+    ]
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'что':<22} {'время, с':>10}")
+    for name, code in cases:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=here, check=True)
+            best = min(best, time.perf_counter() - start)
+        print(f"{name:<22} {best:>10.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности анализатора.")
+    parser.add_argument("stage", choices=["frequency", "readability", "startup", "suite", "memory", "tokenizers"], help="что замерять")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="размеры текста в словах")
+    parser.add_argument("--text-sizes", nargs="+", default=TEXT_SIZES, help="размеры текста для suite, memory и tokenizers (1K, 10M, ...)")
+    parser.add_argument("--corpus", nargs="+", help="файлы или каталоги с текстами *.txt для tokenizers вместо сгенерированного текста")
+    parser.add_argument("--seed", type=int, default=0, help="зерно генератора текста")
+    parser.add_argument("--save", help="сохранить результаты suite в JSON как базу для сравнения")
+    parser.add_argument("--compare", help="сравнить результаты suite с сохранённой базой")
+    args = parser.parse_args(argv)
+
+    if args.stage == "frequency":
+        bench_frequency(args.sizes)
+    elif args.stage == "readability":
+        bench_readability(args.sizes)
+    elif args.stage == "startup":
+        bench_startup()
+    elif args.stage == "suite":
+        bench_suite(args.text_sizes, args.save, args.compare, args.seed)
+    elif args.stage == "memory":
+        bench_memory(args.text_sizes, args.seed)
+    elif args.stage == "tokenizers":
+        bench_tokenizers(args.text_sizes, args.corpus, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""Корпусный индекс: основа -> (документ, номера слов) по всем текстам каталога.
+
+    python corpus_index.py build path/to/texts -o corpus.index
+    python corpus_index.py add corpus.index
+    python corpus_index.py top corpus.index --author Иванов
+    python corpus_index.py top corpus.index --document Иванов/статья.txt
+    python corpus_index.py compact corpus.index
+
+Автор документа — первый подкаталог в пути относительно корня корпуса
+(тексты прямо в корне автора не имеют).
+
+Индекс — каталог с manifest.json (документы, сегменты, основы стоп-слов) и
+неизменяемыми файлами сегментов. Сегмент читается через mmap: основы лежат
+одним блоком строк, остальное — столбцы int32 (array('i')), из которых
+memoryview читает без копирования. Каталог документов сегмента указывает на
+записи каждого документа, поэтому запрос по автору или документу читает только
+их, а не весь сегмент. add анализирует только новые и изменённые
+файлы и дописывает их одним новым сегментом; записи удалённых и изменённых
+документов просто перестают учитываться. compact переписывает все сегменты в
+один без повторного анализа.
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from text_engine import init_worker, worker_analyzer
+
+logging.basicConfig(level=logging.INFO)
+
+INDEX_FORMAT = 2
+MANIFEST = "manifest.json"
+SEGMENT_MAGIC = b"TAIX"
+# magic, формат, основ, вхождений основ в документы, позиций, документов, длина блока основ в байтах
+SEGMENT_HEADER = struct.Struct("<4sIIIIII")
+# Столбцы сегмента по порядку: первое вхождение основы и число её документов;
+# по вхождению: документ, номер основы, начало и длина его позиций в столбце positions;
+# каталог документов по возрастанию номера: документ, начало и число его вхождений
+# в столбце doc_postings, где номера вхождений сгруппированы по документам
+SEGMENT_COLUMNS = ("stem_firsts", "stem_counts", "doc_ids", "posting_stems", "position_starts", "position_counts",
+                   "positions", "segment_docs", "doc_firsts", "doc_counts", "doc_postings")
+
+assert array("i").itemsize == 4
+
+def index_document(path, encoding="utf-8"):
+    """Выполняется в процессе пула: (sha256 текста, число слов, основа -> array('i') номеров слов)."""
+    try:
+        data = Path(path).read_bytes()
+        text = data.decode(encoding)
+    except (OSError, UnicodeDecodeError) as error:
+        return None, str(error), None
+    positions = worker_analyzer().stem_positions(text)
+    words = sum(len(word_positions) for word_positions in positions.values())
+    return hashlib.sha256(data).hexdigest(), words, positions
+
+
+def write_segment(path, postings):
+    """Записывает сегмент; postings — основа -> список (номер документа, array('i') позиций)."""
+    stems = sorted(postings)
+    columns = {name: array("i") for name in SEGMENT_COLUMNS}
+    document_postings = {}  # документ -> номера его вхождений
+    for stem_number, stem in enumerate(stems):
+        columns["stem_firsts"].append(len(columns["doc_ids"]))
+        columns["stem_counts"].append(len(postings[stem]))
+        for doc_id, positions in sorted(postings[stem], key=lambda posting: posting[0]):
+            document_postings.setdefault(doc_id, array("i")).append(len(columns["doc_ids"]))
+            columns["doc_ids"].append(doc_id)
+            columns["posting_stems"].append(stem_number)
+            columns["position_starts"].append(len(columns["positions"]))
+            columns["position_counts"].append(len(positions))
+            columns["positions"].extend(positions)
+    for doc_id in sorted(document_postings):
+        columns["segment_docs"].append(doc_id)
+        columns["doc_firsts"].append(len(columns["doc_postings"]))
+        columns["doc_counts"].append(len(document_postings[doc_id]))
+        columns["doc_postings"].extend(document_postings[doc_id])
+    stems_block = "\n".join(stems).encode("utf-8")
+    stems_block += b"\0" * (-len(stems_block) % 4)  # Столбцы int32 выровнены по 4 байтам
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, INDEX_FORMAT, len(stems), len(columns["doc_ids"]),
+                                       len(columns["positions"]), len(columns["segment_docs"]), len(stems_block)))
+        file.write(stems_block)
+        for name in SEGMENT_COLUMNS:
+            columns[name].tofile(file)
+    os.replace(temporary, path)
+
+
+class Segment:
+    """Сегмент индекса, открытый через mmap; столбцы — memoryview формата 'i'."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, *counts, stems_size = SEGMENT_HEADER.unpack_from(self.data)
+        if magic != SEGMENT_MAGIC or version != INDEX_FORMAT:
+            raise ValueError(f"{path}: not an index segment of format {INDEX_FORMAT}")
+        stem_count, posting_count, position_count, document_count = counts
+        offset = SEGMENT_HEADER.size
+        stems_block = bytes(self.data[offset:offset + stems_size]).rstrip(b"\0")
+        self.stems = stems_block.decode("utf-8").split("\n") if stem_count else []
+        offset += stems_size
+        self.view = memoryview(self.data)
+        lengths = (stem_count, stem_count, posting_count, posting_count, posting_count, posting_count,
+                   position_count, document_count, document_count, document_count, posting_count)
+        for name, length in zip(SEGMENT_COLUMNS, lengths):
+            setattr(self, name, self.view[offset:offset + length * 4].cast("i"))
+            offset += length * 4
+
+    def postings(self, doc_ids):
+        """(основа, документ, array('i') позиций) для документов из множества doc_ids.
+
+        Документы ищутся в каталоге сегмента, и читаются только их вхождения.
+        """
+        segment_docs = self.segment_docs
+        for doc_id in sorted(doc_ids):
+            row = bisect.bisect_left(segment_docs, doc_id)
+            if row == len(segment_docs) or segment_docs[row] != doc_id:
+                continue
+            first = self.doc_firsts[row]
+            # Срезы отпускаются сразу, иначе mmap нельзя будет закрыть
+            with self.doc_postings[first:first + self.doc_counts[row]] as document_postings:
+                for posting in document_postings:
+                    start = self.position_starts[posting]
+                    positions = array("i")
+                    # Копия байтов позиций
+                    with self.positions[start:start + self.position_counts[posting]] as view, view.cast("B") as data:
+                        positions.frombytes(data)
+                    yield self.stems[self.posting_stems[posting]], doc_id, positions
+
+    def close(self):
+        for name in SEGMENT_COLUMNS:
+            getattr(self, name).release()
+        self.view.release()
+        self.data.close()
+        self.file.close()
+
+
+class CorpusIndex:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as file:
+            self.manifest = json.load(file)
+        if self.manifest["format"] != INDEX_FORMAT:
+            raise ValueError(f"{directory}: index format {self.manifest['format']} is not supported, rebuild it with build")
+        self.segments = [Segment(os.path.join(directory, name)) for name in self.manifest["segments"]]
+        self.stop_stems = frozenset(self.manifest["stop_stems"])
+
+    @classmethod
+    def create(cls, directory, root, language="russian"):
+        from text_engine import TextAnalyzer
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.startswith("segment-"):
+                os.remove(os.path.join(directory, name))
+        analyzer = TextAnalyzer(language)
+        manifest = {
+            "format": INDEX_FORMAT,
+            "root": os.path.abspath(root),
+            "language": language,
+            "stop_stems": sorted(analyzer.stemmed_stop_words),
+            "next_doc_id": 0,
+            "next_segment": 1,
+            "segments": [],
+            "documents": {},  # путь относительно корня -> {"id", "author", "sha256", "words", "bytes", "mtime"}
+        }
+        write_manifest(directory, manifest)
+        return cls(directory)
+
+    @property
+    def documents(self):
+        return self.manifest["documents"]
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+    def update(self, pattern="*.txt", encoding="utf-8", jobs=None):
+        """Индексирует новые и изменённые файлы корня корпуса и забывает удалённые."""
+        root = Path(self.manifest["root"])
+        paths = {path.relative_to(root).as_posix(): path for path in sorted(root.rglob(pattern)) if path.is_file()}
+        for name in list(self.documents):
+            if name not in paths:
+                del self.documents[name]
+        # Изменённый файл переиндексируется целиком, старые записи остаются в сегменте до compact
+        candidates = []
+        for name, path in paths.items():
+            info = self.documents.get(name)
+            stat = path.stat()
+            if info is None or info["bytes"] != stat.st_size or info["mtime"] != stat.st_mtime:
+                candidates.append(path)
+        logging.info("Files to index: %d of %d", len(candidates), len(paths))
+
+        postings = {}
+        added = 0
+        if candidates:
+            jobs = jobs or os.cpu_count()
+            with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(self.manifest["language"],)) as pool:
+                chunksize = max(1, len(candidates) // (jobs * 4))
+                for path, (sha256, words, positions) in zip(candidates, pool.map(index_document, candidates, [encoding] * len(candidates), chunksize=chunksize)):
+                    name = path.relative_to(root).as_posix()
+                    if sha256 is None:
+                        logging.warning("Skipping %s: %s", name, words)
+                        continue
+                    stat = path.stat()
+                    old = self.documents.get(name)
+                    if old is not None and old["sha256"] == sha256:
+                        old["bytes"], old["mtime"] = stat.st_size, stat.st_mtime
+                        continue  # Файл тронут, но текст тот же
+                    doc_id = self.manifest["next_doc_id"]
+                    self.manifest["next_doc_id"] += 1
+                    parts = Path(name).parts
+                    self.documents[name] = {
+                        "id": doc_id, "author": parts[0] if len(parts) > 1 else "", "sha256": sha256,
+                        "words": words, "bytes": stat.st_size, "mtime": stat.st_mtime
+                    }
+                    for stem, word_positions in positions.items():
+                        postings.setdefault(stem, []).append((doc_id, word_positions))
+                    added += 1
+        if postings:
+            name = f"segment-{self.manifest['next_segment']:06d}.idx"
+            self.manifest["next_segment"] += 1
+            write_segment(os.path.join(self.directory, name), postings)
+            self.manifest["segments"].append(name)
+            self.segments.append(Segment(os.path.join(self.directory, name)))
+        write_manifest(self.directory, self.manifest)
+        return added
+
+    def compact(self):
+        """Сливает все сегменты в один, отбрасывая записи удалённых и изменённых документов."""
+        live = {document["id"] for document in self.documents.values()}
+        postings = {}
+        for segment in self.segments:
+            for stem, doc_id, positions in segment.postings(live):
+                postings.setdefault(stem, []).append((doc_id, positions))
+        old_segments = self.manifest["segments"]
+        self.close()
+        name = f"segment-{self.manifest['next_segment']:06d}.idx"
+        self.manifest["next_segment"] += 1
+        write_segment(os.path.join(self.directory, name), postings)
+        self.manifest["segments"] = [name]
+        write_manifest(self.directory, self.manifest)
+        for old in old_segments:
+            os.remove(os.path.join(self.directory, old))
+        self.segments = [Segment(os.path.join(self.directory, name))]
+
+    def document_ids(self, author=None, document=None):
+        return {
+            info["id"] for name, info in self.documents.items()
+            if (author is None or info["author"] == author) and (document is None or name == document)
+        }
+
+    def top_stems(self, doc_ids, limit=20, stop_words=False):
+        """Самые частые повторяющиеся основы в документах doc_ids.
+
+        Возвращает список (основа, вхождений, документов, мин. расстояние в словах внутри документа);
+        для основ, встретившихся в каждом документе один раз, расстояние None.
+        """
+        totals = {}  # основа -> [вхождений, документов, мин. расстояние]
+        for segment in self.segments:
+            for stem, _, positions in segment.postings(doc_ids):
+                if not stop_words and stem in self.stop_stems:
+                    continue
+                stats = totals.get(stem)
+                if stats is None:
+                    stats = totals[stem] = [0, 0, None]
+                stats[0] += len(positions)
+                stats[1] += 1
+                if len(positions) > 1:
+                    positions = positions.tolist()
+                    distance = min(b - a for a, b in zip(positions, positions[1:]))
+                    if stats[2] is None or distance < stats[2]:
+                        stats[2] = distance
+        repeated = [(stem, *stats) for stem, stats in totals.items() if stats[0] > 1]
+        repeated.sort(key=lambda item: (-item[1], item[0]))
+        return repeated[:limit]
+
+
+def write_manifest(directory, manifest):
+    temporary = os.path.join(directory, MANIFEST + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=1)
+    os.replace(temporary, os.path.join(directory, MANIFEST))
+
+
+def print_top(index, args):
+    doc_ids = index.document_ids(args.author, args.document)
+    if not doc_ids:
+        print("Нет таких документов", file=sys.stderr)
+        return 1
+    print(f"{'основа':<20} {'вхождений':>10} {'документов':>11} {'мин. расст.':>12}")
+    for stem, count, documents, distance in index.top_stems(doc_ids, args.limit, args.stop_words):
+        print(f"{stem:<20} {count:>10} {documents:>11} {distance if distance is not None else '-':>12}")
+    return 0
+
+
+def print_info(index):
+    authors = {}
+    for info in index.documents.values():
+        author = authors.setdefault(info["author"], [0, 0])
+        author[0] += 1
+        author[1] += info["words"]
+    print(f"корпус: {index.manifest['root']}, сегментов: {len(index.segments)}")
+    print(f"{'автор':<30} {'документов':>11} {'слов':>10}")
+    for author, (documents, words) in sorted(authors.items()):
+        print(f"{author or '-':<30} {documents:>11} {words:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Корпусный индекс основ по каталогу текстов.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="построить индекс каталога заново")
+    build.add_argument("directory", help="каталог с текстами")
+    build.add_argument("-o", "--index", default="corpus.index", help="каталог индекса (по умолчанию corpus.index)")
+    build.add_argument("--language", default="russian", help="язык стеммера и стоп-слов")
+
+    add = commands.add_parser("add", help="добавить новые и изменённые файлы корпуса")
+    add.add_argument("index", help="каталог индекса")
+
+    for command in (build, add):
+        command.add_argument("-p", "--pattern", default="*.txt", help="шаблон имён файлов (по умолчанию *.txt)")
+        command.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="число процессов (по умолчанию все ядра)")
+        command.add_argument("--encoding", default="utf-8", help="кодировка файлов")
+
+    compact = commands.add_parser("compact", help="слить сегменты индекса в один")
+    compact.add_argument("index", help="каталог индекса")
+
+    info = commands.add_parser("info", help="авторы и документы индекса")
+    info.add_argument("index", help="каталог индекса")
+
+    top = commands.add_parser("top", help="самые частые повторяющиеся основы")
+    top.add_argument("index", help="каталог индекса")
+    top.add_argument("--author", help="только документы автора")
+    top.add_argument("--document", help="только документ (путь относительно корня корпуса)")
+    top.add_argument("-n", "--limit", type=int, default=20, help="сколько основ показать")
+    top.add_argument("--stop-words", action="store_true", help="не исключать стоп-слова")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        index = CorpusIndex.create(args.index, args.directory, args.language)
+    else:
+        index = CorpusIndex(args.index)
+    try:
+        if args.command in ("build", "add"):
+            added = index.update(args.pattern, args.encoding, args.jobs)
+            logging.info("Documents indexed: %d, total: %d", added, len(index.documents))
+        elif args.command == "compact":
+            index.compact()
+        elif args.command == "info":
+            print_info(index)
+        elif args.command == "top":
+            return print_top(index, args)
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Замеры этапов анализа и счётчики, включаемые на ходу.
+
+Пока замеры выключены, metrics.stage() возвращает общий пустой контекстный
+менеджер, а metrics.count() сразу выходит, поэтому в рабочем коде их можно
+не убирать.
+"""
+import json
+import os
+import threading
+import time
+
+from collections import Counter
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}  # этап -> {"calls", "total", "last", "max"} (секунды)
+            self.counters = Counter()
+
+    def stage(self, name):
+        """Контекстный менеджер, замеряющий время этапа name."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record(self, name, seconds):
+        with self.lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                self.stages[name] = {"calls": 1, "total": seconds, "last": seconds, "max": seconds}
+            else:
+                stats["calls"] += 1
+                stats["total"] += seconds
+                stats["last"] = seconds
+                stats["max"] = max(stats["max"], seconds)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] += value
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "stages": {name: dict(stats) for name, stats in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def dump_json(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.to_json())
+
+    def summary(self):
+        """Короткая строка для строки состояния."""
+        with self.lock:
+            parts = []
+            analyze = self.stages.get("analyze")
+            if analyze:
+                parts.append(f"анализ {analyze['last']:.2f} с")
+            if self.counters["analysis_cache_hits"]:
+                parts.append("из кэша")
+            if "tokens" in self.counters:
+                parts.append(f"слов {self.counters['tokens']}")
+            lookups = self.counters["stem_cache_hits"] + self.counters["stem_cache_misses"]
+            if lookups:
+                parts.append(f"кэш основ {self.counters['stem_cache_hits'] / lookups:.0%}")
+            if "tk_calls" in self.counters:
+                parts.append(f"вызовов Tk {self.counters['tk_calls']}")
+            return " · ".join(parts)
+
+
+# Общий экземпляр для всей программы; TEXT_ANALYZER_METRICS=1 включает замеры с запуска
+metrics = Metrics(enabled=os.environ.get("TEXT_ANALYZER_METRICS") == "1")
@@ -0,0 +1,93 @@
+"""Нагрузочный тест сервиса анализа (analysis_server.py).
+
+    python load_test.py --concurrency 32 --duration 30 --text-size 4K
+
+Открывает --concurrency соединений, каждое шлёт запросы подряд в течение
+--duration секунд, и печатает пропускную способность, перцентили задержки
+и число ответов 503 (очередь сервиса заполнена).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmark import generate_text, parse_size
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def post(reader, writer, host, path, body):
+    writer.write((f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, path, bodies, deadline, stats):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        index = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = await post(reader, writer, host, path, bodies[index % len(bodies)])
+            index += 1
+            stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+            if status == 200:
+                stats["latencies"].append(time.perf_counter() - start)
+            elif status == 503:
+                await asyncio.sleep(0.05)  # Сервис просит подождать
+    finally:
+        writer.close()
+
+
+async def run(args):
+    texts = [generate_text(parse_size(args.text_size), seed) for seed in range(16)]
+    if args.batch > 1:
+        path = "/batch"
+        bodies = [json.dumps({"texts": [texts[(i + j) % len(texts)] for j in range(args.batch)]}, ensure_ascii=False).encode("utf-8")
+                  for i in range(len(texts))]
+    else:
+        path = "/analyze"
+        bodies = [json.dumps({"text": text}, ensure_ascii=False).encode("utf-8") for text in texts]
+
+    stats = {"latencies": [], "statuses": {}}
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(client(args.host, args.port, path, bodies, deadline, stats) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(stats["latencies"])
+    texts_done = len(latencies) * args.batch
+    print(f"запросов: {sum(stats['statuses'].values())}, ответы: {dict(sorted(stats['statuses'].items()))}")
+    print(f"пропускная способность: {len(latencies) / elapsed:.1f} запросов/с, {texts_done / elapsed:.1f} текстов/с")
+    print(f"задержка, мс: p50 {percentile(latencies, 0.50) * 1000:.1f}, p95 {percentile(latencies, 0.95) * 1000:.1f}, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f}, max {(latencies[-1] if latencies else 0) * 1000:.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервиса анализа.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="число одновременных соединений")
+    parser.add_argument("-d", "--duration", type=float, default=10, help="длительность теста, с")
+    parser.add_argument("--text-size", default="4K", help="размер текста в запросе (например 1K, 100K)")
+    parser.add_argument("--batch", type=int, default=1, help="текстов в запросе (больше 1 — запросы к /batch)")
+    asyncio.run(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
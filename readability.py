@@ -0,0 +1,90 @@
+"""Индексы удобочитаемости, посчитанные сразу по массиву слов.
+
+Словоформы в тексте сильно повторяются, поэтому массив слов сначала сворачивается
+в Counter (подсчёт идёт в C), а слоги и признак трудного слова вычисляются один
+раз на словоформу; гласные считаются через str.translate, без цикла по буквам.
+"""
+from collections import Counter
+
+VOWELS = "аеёиоуыэюя"
+_DROP_VOWELS = str.maketrans("", "", VOWELS + VOWELS.upper())
+
+
+def count_syllables(word):
+    """Упрощённый подсчёт слогов: считаем гласные."""
+    return len(word) - len(word.translate(_DROP_VOWELS))
+
+
+def is_hard_word_exception(word):
+    # Исключения (собственные имена, сложные слова)
+    return (word[0].isupper() or
+            any(part.lower() in word and len(part) > 0 for part in ["-", "–"]) or  # сложные ч-з дефис
+            word.endswith(("ович", "евич", "овна", "евна", "ична", "ьич")))  # и отчества
+
+
+def is_hard_word(word):
+    """Трудное слово для индекса туманности: 4 и более слогов (адаптация для русского)."""
+    return count_syllables(word) >= 4 and not is_hard_word_exception(word)
+
+
+def count_readability(words):
+    """Возвращает (слогов, трудных слов) для массива слов."""
+    syllables = 0
+    hard_words = 0
+    for word, count in Counter(words).items():
+        word_syllables = len(word) - len(word.translate(_DROP_VOWELS))
+        syllables += word_syllables * count
+        if word_syllables >= 4 and not is_hard_word_exception(word):
+            hard_words += count
+    return syllables, hard_words
+
+
+def calculate_fog_index(num_sentences, num_words, hard_words):
+    """Рассчитывает индекс туманности Ганнинга."""
+    if num_sentences == 0 or num_words == 0:
+        return 0
+
+    # ASL (Average Sentence Length)
+    asl = num_words / num_sentences
+
+    # PSW (Percentage of Hard Words)
+    psw = (hard_words / num_words) * 100 if num_words > 0 else 0
+
+    # Gunning Fog Index
+    fog_index = 0.3 * (asl + psw)
+    return fog_index
+
+
+def calculate_flesch_index(num_sentences, num_words, num_syllables, russian_adaptation=True):
+    """Вычисляет индекс удобочитаемости Флеша."""
+    if num_sentences == 0 or num_words == 0:
+        return 100  # Возвращаем 100 для пустого текста (очень простой)
+
+    asl = num_words / num_sentences
+    asw = num_syllables / num_words
+    if russian_adaptation:
+        # Адаптация Мирошниченко
+        # flesch_index = 208.7 - (1.52 * asl) - (65.14 * asw)
+        flesch_index = 206.835 - (1.3 * asl) - (60.1 * asw)
+    else:
+        flesch_index = 206.835 - (1.015 * asl) - (84.6 * asw)
+
+    # Ограничиваем FRE в пределах [0, 100]
+    flesch_index = max(0, min(flesch_index, 100))
+    return flesch_index
+
+
+def score_documents(documents, russian_adaptation=True):
+    """Индексы Флеша и туманности для многих документов за один вызов.
+
+    documents — последовательность пар (число предложений, список слов).
+    Возвращает список пар (индекс Флеша, индекс туманности).
+    """
+    scores = []
+    for num_sentences, words in documents:
+        syllables, hard_words = count_readability(words)
+        scores.append((
+            calculate_flesch_index(num_sentences, len(words), syllables, russian_adaptation),
+            calculate_fog_index(num_sentences, len(words), hard_words)
+        ))
+    return scores
@@ -1,39 +1,26 @@
 import tkinter as tk
-import nltk
+import bisect
 import logging
-import re
+import queue
+import sqlite3
+import threading
+import time
 
-from tkinter import ttk
-from nltk.stem import SnowballStemmer
-from nltk.tokenize import word_tokenize, sent_tokenize
-from collections import Counter
+from tkinter import ttk, filedialog
 from dataclasses import dataclass
+from analysis_cache import AnalysisCache, default_cache_path
+from instrumentation import metrics
+from text_engine import AnalysisCancelled, TextAnalyzer, WordInfo, preprocess_text
+from word_list import SORT_KEYS, SortedWords, VirtualListbox
 
 logging.basicConfig(level=logging.INFO)
 
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    logging.info("Downloading necessary punkt data...")
-    nltk.download('punkt')
-
-try:
-    nltk.data.find('tokenizers/punkt_tab')
-except LookupError:
-    logging.info("Downloading necessary punkt_tab data...")
-    nltk.download('punkt_tab')
-
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    logging.info("Downloading necessary stopwords data...")
-    nltk.download('stopwords')
-
-@dataclass
-class WordInfo:
-    count: int
-    min_distance: int
-    is_stopword: bool
+LIVE_ANALYSIS_DELAY_MS = 500  # Пауза после ввода, после которой запускается анализ
+ANALYSIS_POLL_MS = 50         # Как часто окно забирает прогресс и результат фонового анализа
+HIGHLIGHT_MARGIN_LINES = 100  # Сколько строк над и под видимой областью подсвечивается заранее
+HIGHLIGHT_FRAME_BUDGET = 0.015  # Сколько секунд подсветка может занимать за один кадр
+# Тег выбранной фразы; теги слов называются основами (буквы, цифры, «_» и «-»), и с ними он не совпадёт
+PHRASE_TAG = "phrase:selected"
 
 @dataclass
 class HighlightMode:
@@ -52,16 +39,44 @@ class DuplicateWordFinder(tk.Tk):
         self.text_length = 100   # Минимальная длина текста для нормировки
         self.word_info = {}      # Добавляем словарь для хранения информации о словах
         self.sorted_words = []
-
-        # Стоп-слова (можно расширить)
-        self.stop_words = set(nltk.corpus.stopwords.words('russian'))
+        self.sorted_views = {}   # вид сортировки -> SortedWords, пока не пришёл новый результат
+        self.sort_type = "count"
+        self.phrases = {}        # текст фразы -> PhraseInfo; None, если при последнем анализе фразы не искались
+        self.phrases_wanted = False  # Нажата кнопка «Фразы», а фраз ещё нет: показать их после анализа
+        self.selected_phrase = None
+
+        # Подсветка: вхождения из результата анализа размечаются только около видимой области
+        self.highlight_stems = []
+        self.highlight_starts = []
+        self.highlight_ends = []
+        self.line_starts = []
+        self.text_size = 0
+        self.highlight_range = None    # (начало, конец) размеченной области текста
+        self.highlight_tags = {}       # основа -> цвет размеченного тега
+        self.pending_highlights = []   # (основа, индексы) ещё не размеченные в текущем кадре
+        self.highlight_stale = False   # текст изменён после анализа, смещения устарели
+        self.selected_word = ""
+        self.highlight_refresh_job = None
+        self.highlight_batch_job = None
+
+        # Анализ текста выполняется отдельным движком, окно только отображает результат.
+        # Движок помнит разобранные абзацы, поэтому повторный анализ обрабатывает только изменённые,
+        # а результаты уже анализированных текстов берёт из кэша на диске.
+        # Создание движка загружает NLTK, поэтому оно откладывается до появления окна (см. warm_up).
+        self.analyzer = None
+        self.analyzer_lock = threading.Lock()
+        self.tokenizer = "punkt"  # Меняется в меню «Сервис»; движок пересоздаётся при следующем анализе
+        self.live_analysis_job = None
+
+        # Фоновый анализ: поток кладёт прогресс и результат в очередь, окно забирает их через after()
+        self.analysis_queue = queue.Queue()
+        self.analysis_cancel = None  # threading.Event текущего анализа
+        self.analysis_poll_job = None
 
         # Настройка растягивания окна
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(1, weight=1)
 
-        self.stemmer = SnowballStemmer("russian")
-
         # Метки
         self.input_label = ttk.Label(self, text="Текст:")
         self.input_label.grid(row=0, column=0, sticky="w", padx=5, pady=5)
@@ -73,18 +88,17 @@ class DuplicateWordFinder(tk.Tk):
         self.input_text = tk.Text(self, wrap=tk.WORD)
         self.input_text.grid(row=1, column=0, padx=5, pady=5, sticky="nsew")
         self.input_text.bind("<Button-1>", self.highlight_word)
+        self.input_text.bind("<<Modified>>", self.text_modified)
 
-        self.output_listbox = tk.Listbox(self, width=40)  # Задали фиксированную ширину
+        # В списке слов создаются только видимые строки, полоса прокрутки у него своя
+        self.output_listbox = VirtualListbox(self, width=40)  # Задали фиксированную ширину
         self.output_listbox.grid(row=1, column=1, padx=5, pady=5, sticky="nsew")
-        self.output_listbox.bind("<Button-1>", self.highlight_word)
+        self.output_listbox.listbox.bind("<Button-1>", self.highlight_word)
 
         # Добавляем скроллбары для обоих текстовых полей
-        scroll = ttk.Scrollbar(self, orient="vertical", command=self.input_text.yview)
-        scroll.grid(row=1, column=0, sticky="nse")
-        self.input_text.configure(yscrollcommand=scroll.set)
-        scroll = ttk.Scrollbar(self, orient="vertical", command=self.output_listbox.yview)
-        scroll.grid(row=1, column=1, sticky="nse")
-        self.output_listbox.configure(yscrollcommand=scroll.set)
+        self.input_scroll = ttk.Scrollbar(self, orient="vertical", command=self.input_text.yview)
+        self.input_scroll.grid(row=1, column=0, sticky="nse")
+        self.input_text.configure(yscrollcommand=self.input_scrolled)
 
         # Кнопка "Вставить"
         self.paste_button = ttk.Button(self, text="Вставить", command=self.paste_text)
@@ -94,6 +108,11 @@ class DuplicateWordFinder(tk.Tk):
         self.analyze_button = ttk.Button(self, text="Анализировать", command=self.analyze_text)
         self.analyze_button.grid(row=2, column=1, pady=10, sticky="ew", padx=5)
 
+        # Прогресс фонового анализа, показывается только во время анализа
+        self.progress_bar = ttk.Progressbar(self, mode="determinate", maximum=1.0)
+        self.progress_bar.grid(row=3, column=0, columnspan=2, sticky="ew", padx=5)
+        self.progress_bar.grid_remove()
+
         # Кнопки сортировки
         self.sort_frame = ttk.Frame(self)
         self.sort_frame.grid(row=0, column=1, sticky="e", pady=(5, 0))
@@ -108,6 +127,10 @@ class DuplicateWordFinder(tk.Tk):
                                                    command=lambda: self.sort_results("distance"))
         self.sort_by_distance_button.pack(side="left", padx=2)
 
+        self.sort_by_phrases_button = ttk.Button(self.sort_frame, text="Фразы",
+                                                  command=lambda: self.sort_results("phrases"))
+        self.sort_by_phrases_button.pack(side="left", padx=2)
+
         # Добавляем метки для статистики
         self.char_count_label = ttk.Label(self, text="Кол-во символов с пробелами: -")
         self.char_count_label.grid(row=4, column=0, sticky="w", padx=5, pady=5)
@@ -148,6 +171,10 @@ class DuplicateWordFinder(tk.Tk):
         self.stop_word_check = ttk.Checkbutton(self.highlight_frame, text="Стоп-слова", variable=self.stop_word_var, command=self.update_highlight_options)
         self.stop_word_check.pack(anchor="w")
 
+        self.live_analysis_var = tk.BooleanVar(value=False)
+        self.live_analysis_check = ttk.Checkbutton(self.highlight_frame, text="Анализ при вводе", variable=self.live_analysis_var, command=self.text_modified)
+        self.live_analysis_check.pack(anchor="w")
+
         # Меню
         self.menu_bar = tk.Menu(self)
         self.config(menu=self.menu_bar)
@@ -160,8 +187,26 @@ class DuplicateWordFinder(tk.Tk):
         self.edit_menu.add_command(label="Вырезать", command=self.cut_text, accelerator="Ctrl+X")
         self.edit_menu.add_command(label="Выделить все", command=self.select_all, accelerator="Ctrl+A")
 
+        self.tools_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Сервис", menu=self.tools_menu)
+
+        self.metrics_var = tk.BooleanVar(value=metrics.enabled)
+        self.tools_menu.add_checkbutton(label="Замеры производительности", variable=self.metrics_var, command=self.toggle_metrics)
+        self.tools_menu.add_command(label="Сохранить замеры...", command=self.save_metrics)
+        self.tools_menu.add_separator()
+        self.fast_tokenizer_var = tk.BooleanVar(value=False)
+        self.tools_menu.add_checkbutton(label="Быстрая токенизация", variable=self.fast_tokenizer_var, command=self.toggle_tokenizer)
+        self.tools_menu.add_command(label="Очистить кэш анализа", command=self.clear_cache)
+
+        # Строка состояния с кратким итогом замеров
+        self.status_label = ttk.Label(self, text="")
+        self.status_label.grid(row=12, column=0, columnspan=2, sticky="w", padx=5, pady=(0, 5))
+
         self.bind_all("<KeyPress>", self.key_event_handler, add="+")
 
+        # NLTK загружается в фоне, когда окно уже на экране
+        self.after_idle(self.warm_up)
+
     def key_event_handler(self, event):
         if event.keysym != "??":  # Исключаем дублированную обработку события
             return
@@ -179,44 +224,6 @@ class DuplicateWordFinder(tk.Tk):
             elif event.keycode == 65:  # 'a' keycode
                 self.select_all()
 
-    def preprocess_text(self, text):
-        text = text.lower()
-        text = re.sub(r'[^\w\s\-]', ' ', text)  # Keep hyphens
-        return text
-
-    def calculate_fog_index(self, text, words):
-        """Рассчитывает индекс туманности Ганнинга."""
-        sentences = sent_tokenize(text, language="russian")
-        num_sentences = len(sentences)
-        num_words = len(words)
-
-        if num_sentences == 0 or num_words == 0:
-            return 0
-
-        # ASL (Average Sentence Length)
-        asl = num_words / num_sentences
-
-        # Hard Words (слова с 4 и более слогами) - адаптация для русского
-        hard_words = 0
-        for word in words:
-            syllables = 0
-            for char in word:
-                if char.lower() in 'аеёиоуыэюя':
-                    syllables += 1
-            if syllables >= 4:
-                # Исключения (собственные имена, сложные слова)
-                if not (word[0].isupper() or
-                        any(part.lower() in word and len(part) > 0 for part in ["-", "–"]) or  # сложные ч-з дефис
-                        word.endswith(("ович", "евич", "овна", "евна", "ична", "ьич"))):  # и отчества
-                    hard_words += 1
-
-        # PSW (Percentage of Hard Words)
-        psw = (hard_words / num_words) * 100 if num_words > 0 else 0
-
-        # Gunning Fog Index
-        fog_index = 0.3 * (asl + psw)
-        return fog_index
-
     def help_fog_index(self, fog_index):
         if fog_index < 7:
             return "Простой для чтения текст, подходящий для широкой аудитории."
@@ -228,37 +235,6 @@ class DuplicateWordFinder(tk.Tk):
             return "Текст высокой сложности, подходит для высокообразованных читателей или специалистов в данной области."
         return "Очень сложный текст, который может быть труден для понимания даже для экспертов."
 
-    def count_syllables(self, word):
-        """Упрощённый подсчёт слогов: считаем гласные."""
-        return len(re.findall(r'[аеёиоуыэюя]', word.lower()))
-
-    def calculate_flesch_index(self, text, russian_adaptation=True):
-        """Вычисляет индекс удобочитаемости Флеша."""
-        sentences = sent_tokenize(text, language="russian")
-        total_words = 0
-        total_syllables = 0
-
-        for sentence in sentences:
-            words = word_tokenize(sentence, language="russian")
-            total_words += len(words)
-            for word in words:
-                total_syllables += self.count_syllables(word)
-        if len(sentences) == 0 or total_words == 0:
-            return 100  # Возвращаем 100 для пустого текста (очень простой)
-
-        asl = total_words / len(sentences)
-        asw = total_syllables / total_words
-        if russian_adaptation:
-            # Адаптация Мирошниченко
-            # flesch_index = 208.7 - (1.52 * asl) - (65.14 * asw)
-            flesch_index = 206.835 - (1.3 * asl) - (60.1 * asw)
-        else:
-            flesch_index = 206.835 - (1.015 * asl) - (84.6 * asw)
-
-        # Ограничиваем FRE в пределах [0, 100]
-        flesch_index = max(0, min(flesch_index, 100))
-        return flesch_index
-
     def help_flesch(self, score):
         if score >= 90:
             return "Очень легко читается. Понятно 11-летнему школьнику."
@@ -275,84 +251,119 @@ class DuplicateWordFinder(tk.Tk):
         else:
             return "Очень сложно читается. Лучше иметь ученую степень."
 
-    def calculate_percentage(self, a, b):
-        if b < 1:
-            return 0
-        return (a / b) * 100
+    def get_analyzer(self):
+        with self.analyzer_lock:
+            if self.analyzer is None or self.analyzer.tokenizer != self.tokenizer:
+                cache = self.analyzer.cache if self.analyzer is not None else self.open_cache()
+                self.analyzer = TextAnalyzer("russian", incremental=True, cache=cache, tokenizer=self.tokenizer)
+            return self.analyzer
 
-    def analyze_text(self):
+    def open_cache(self):
+        try:
+            return AnalysisCache(default_cache_path())
+        except (OSError, sqlite3.Error) as error:
+            logging.warning("Analysis cache is unavailable: %s", error)
+            return None
+
+    def warm_up(self):
+        threading.Thread(target=self.warm_up_worker, daemon=True).start()
+
+    def warm_up_worker(self):
+        try:
+            self.get_analyzer()
+        except Exception as error:
+            # Анализ попробует создать движок ещё раз и сообщит об ошибке
+            logging.warning("NLTK warm-up failed: %s", error)
+
+    def analyze_text(self, live=False):
+        # Повторное нажатие отменяет устаревший анализ и запускает новый
+        self.cancel_analysis()
+        metrics.reset()  # Замеры относятся к последнему анализу и работе с его результатом
+        self.analysis_started = time.perf_counter()
         text = self.input_text.get("1.0", tk.END)
-        processed_text = self.preprocess_text(text)
-        words = word_tokenize(processed_text, language="russian")  # Токенизация по языку
-        self.text_length = max(len(words), 100)
-
-        stemmed_words = [self.stemmer.stem(word) for word in words]
-        stemmed_stop_words = set([self.stemmer.stem(word) for word in self.stop_words])
-
-        self.word_info = {}  # Очищаем word_info перед заполнением
-        unique_count = 0
-        stop_count = 0
-        max_frec = 0
-        for stemmed_word in set(stemmed_words):  # Итерируем по уникальным стеммированным словам
-            wcount = stemmed_words.count(stemmed_word)
-            is_stop_word = stemmed_word in stemmed_stop_words
-            if wcount == 1:  # считаем уникальные слова
-                unique_count = unique_count + 1
-            if is_stop_word:  # считаем стоп слова
-                stop_count = stop_count + wcount
-            elif max_frec < wcount:
-                max_frec = wcount
-            if (wcount > 1 or is_stop_word):
-                self.word_info[stemmed_word] = WordInfo(
-                    count = wcount,
-                    min_distance = self.text_length,  # Инициализируем максимальным значением
-                    is_stopword = is_stop_word
-                )
-
-        # Удаляем все теги подсветки
-        for tag in self.input_text.tag_names():
-            self.input_text.tag_remove(tag, "1.0", tk.END)
-
-        word_positions = {}
-        char_index = 0
-        for i, word in enumerate(words):
-            # Находим позицию слова в исходном тексте
-            char_index = processed_text.find(word, char_index)
-            stemmed_word = stemmed_words[i]
-            if stemmed_word in self.word_info:
-                if stemmed_word not in word_positions:
-                    word_positions[stemmed_word] = []
-                # Добавляем и номер слова, и позицию в тексте
-                word_positions[stemmed_word].append(i)
-                self.input_text.tag_add(stemmed_word, f"1.0+{char_index}c", f"1.0+{char_index + len(word)}c")
-            char_index += len(word)  # Обновляем индекс для следующего поиска
-
-        # Вычисляем минимальные расстояния для каждого слова
-        for stemmed_word, positions in word_positions.items():
-            if len(positions) > 1:
-                min_dist = float('inf')
-                for i in range(len(positions) - 1):
-                    # Используем номера слов для расчета расстояния
-                    distance = positions[i + 1] - positions[i]
-                    min_dist = min(min_dist, distance)
-                self.word_info[stemmed_word].min_distance = min_dist
+        cancel = threading.Event()
+        self.analysis_cancel = cancel
+        self.progress_bar["value"] = 0
+        self.progress_bar.grid()
+        # Фразы ищутся по всему тексту; при анализе во время ввода — только если их список открыт
+        phrases = not live or self.sort_type == "phrases" or self.phrases_wanted
+        # В кэш на диске пишутся только явные запуски, а не каждая пауза при вводе
+        threading.Thread(target=self.analysis_worker, args=(text, cancel, phrases, not live), daemon=True).start()
+        if not self.analysis_poll_job:
+            self.analysis_poll_job = self.after(ANALYSIS_POLL_MS, self.poll_analysis)
+
+    def cancel_analysis(self):
+        if self.analysis_cancel is not None:
+            self.analysis_cancel.set()
+            self.analysis_cancel = None
+            self.progress_bar.grid_remove()
+
+    def analysis_worker(self, text, cancel, phrases, store):
+        # Работает в отдельном потоке: к виджетам не обращаемся, только к очереди
+        def progress(done, total):
+            self.analysis_queue.put(("progress", cancel, done / total))
+        try:
+            result = self.get_analyzer().analyze(text, progress=progress, cancel=cancel, phrases=phrases, store=store)
+        except AnalysisCancelled:
+            return
+        except Exception as error:
+            self.analysis_queue.put(("error", cancel, error))
+            return
+        self.analysis_queue.put(("result", cancel, result))
+
+    def poll_analysis(self):
+        self.analysis_poll_job = None
+        while True:
+            try:
+                kind, cancel, payload = self.analysis_queue.get_nowait()
+            except queue.Empty:
+                break
+            if cancel is not self.analysis_cancel:
+                continue  # Сообщение от отменённого анализа
+            if kind == "progress":
+                self.progress_bar["value"] = payload
+                continue
+            self.analysis_cancel = None
+            self.progress_bar.grid_remove()
+            if kind == "result":
+                with metrics.stage("show_analysis"):
+                    self.show_analysis(payload)
+                if metrics.enabled:
+                    metrics.record("analysis_wall", time.perf_counter() - self.analysis_started)
+                    self.update_status()
+            else:
+                logging.error("Analysis failed: %s", payload)
+        if self.analysis_cancel is not None:
+            self.analysis_poll_job = self.after(ANALYSIS_POLL_MS, self.poll_analysis)
+
+    def show_analysis(self, result):
+        logging.debug("Stem cache: %s", self.analyzer.stem_cache_info())
+        self.word_info = result.word_info
+        self.text_length = result.text_length
+
+        self.highlight_stems = result.highlight_stems
+        self.highlight_starts = result.highlight_starts
+        self.highlight_ends = result.highlight_ends
+        self.line_starts = result.line_starts
+        self.text_size = result.char_count
+        self.highlight_stale = False
+        self.highlight_range = None  # Разметить заново
 
         # Обновляем статистику
-        self.char_count_label.config(text=f"Кол-во символов с пробелами: {len(text)}")
-        char_count_no_spaces = len(text.replace(" ", ""))
-        self.char_count_no_spaces_label.config(text=f"Кол-во символов без пробелов: {char_count_no_spaces}")
-        self.word_count_label.config(text=f"Кол-во слов: {len(words)}")
+        self.char_count_label.config(text=f"Кол-во символов с пробелами: {result.char_count}")
+        self.char_count_no_spaces_label.config(text=f"Кол-во символов без пробелов: {result.char_count_no_spaces}")
+        self.word_count_label.config(text=f"Кол-во слов: {result.word_count}")
 
-        # Рассчитываем индекс удобочитаемости и обновляем метку
-        easy_index = self.calculate_flesch_index(text)
+        # Индекс удобочитаемости
+        easy_index = result.flesch_index
         self.easy_index_label.config(text=f"Индекс удобочитаемости: {easy_index:.2f} - " + self.help_flesch(easy_index))
 
-        # Рассчитываем индекс туманности и обновляем метку
-        fog_index = self.calculate_fog_index(text, words)
+        # Индекс туманности
+        fog_index = result.fog_index
         self.fog_index_label.config(text=f"Индекс туманности: {fog_index:.2f} - " + self.help_fog_index(fog_index))
 
-        # Рассчитываем и выводим процент разнообразия
-        diversity_percentage = self.calculate_percentage(unique_count, len(words) - stop_count)
+        # Процент разнообразия
+        diversity_percentage = result.diversity_percentage
         diversity_text = f"Процент разнообразия: {diversity_percentage:.2f}% - "
         if diversity_percentage < 30:
             diversity_text += "Низкое разнообразие слов."
@@ -362,8 +373,8 @@ class DuplicateWordFinder(tk.Tk):
             diversity_text += "Достаточное разнообразие слов."
         self.diversity_percentage_label.config(text=diversity_text)
 
-        # Рассчитываем и выводим процент водности
-        water_percentage = self.calculate_percentage(stop_count, len(words))
+        # Процент водности
+        water_percentage = result.water_percentage
         water_text = f"Процент стоп слов: {water_percentage:.2f}% - "
         if water_percentage < 15:
             water_text += "Естественное содержание «воды»."
@@ -373,8 +384,8 @@ class DuplicateWordFinder(tk.Tk):
             water_text += "Высокое содержание «воды»."
         self.water_percentage_label.config(text=water_text)
 
-        # Рассчитываем и выводим процент заспамленности
-        spam_percentage = self.calculate_percentage(max_frec, len(words) - stop_count)
+        # Процент заспамленности
+        spam_percentage = result.spam_percentage
         spam_text = f"Процент заспамленности: {spam_percentage:.2f}% - "
         if spam_percentage < 30:
             spam_text += "Естественное содержание ключевых слов."
@@ -384,28 +395,51 @@ class DuplicateWordFinder(tk.Tk):
             spam_text += "Сильно оптимизированный или заспамленный текст."
         self.spam_percentage_label.config(text=spam_text)
 
-        self.sort_results("count")  # Сортируем по умолчанию по частоте
-        self.update_highlight()  # Подсвечиваем все слова при анализе
+        self.phrases = None if result.phrases is None else {phrase.text: phrase for phrase in result.phrases}
+        self.select_phrase(None)
+        self.sorted_views = {}
+        # Сортируем по умолчанию по частоте; открытый или ожидаемый список фраз остаётся
+        show_phrases = self.phrases is not None and (self.sort_type == "phrases" or self.phrases_wanted)
+        if self.phrases is not None:
+            self.phrases_wanted = False
+        self.sort_results("phrases" if show_phrases else "count")
+        self.selected_word = ""
+        self.refresh_highlight()  # Подсвечиваем слова в видимой области
 
     def sort_results(self, sort_type):
-        if sort_type == "count":
-            self.sorted_words = sorted(self.word_info.items(), key=lambda item: item[1].count, reverse=True)
-        elif sort_type == "distance":
-            # Сортируем по минимальному расстоянию, затем по частоте (если расстояния равны)
-            self.sorted_words = sorted(self.word_info.items(), key=lambda item: (item[1].min_distance, -item[1].count))
+        if sort_type == "phrases" and self.phrases is None:
+            # Анализ при вводе фраз не искал: ищем полным анализом и показываем, когда он закончится
+            self.phrases_wanted = True
+            self.analyze_text()
+            return
+        with metrics.stage("sort_results"):
+            self.fill_results(sort_type)
+
+    def fill_results(self, sort_type):
+        self.sort_type = sort_type
+        view = self.sorted_views.get(sort_type)
+        if view is None:
+            items = self.phrases if sort_type == "phrases" else self.word_info
+            view = self.sorted_views[sort_type] = SortedWords(items, SORT_KEYS[sort_type])
+        self.sorted_words = view
 
-        self.output_listbox.delete(0, tk.END)  # Очистка списка
-        for word, info in self.sorted_words:
-            self.output_listbox.insert(tk.END, f"{word}: {info.count}")  # Добавление элемента
+        # Строки списка формируются только для видимой части
+        self.output_listbox.set_rows(len(view), lambda first, count: [f"{word}: {info.count}" for word, info in view.rows(first, count)])
 
     def get_clicked_word(self, event=None):
         if not event:
             return ""
-        char = self.input_text.count("1.0", self.input_text.index(f"@{event.x},{event.y}"), "chars")
-        if not char:
+        line, column = map(int, self.input_text.index(f"@{event.x},{event.y}").split("."))
+        if not self.highlight_stale and line <= len(self.line_starts):
+            # Ищем вхождение по индексу позиций из анализа
+            offset = self.line_starts[line - 1] + column
+            i = bisect.bisect_right(self.highlight_starts, offset) - 1
+            if i >= 0 and offset <= self.highlight_ends[i]:
+                return self.highlight_stems[i]
             return ""
-        start_char = char[0]
-        text = self.preprocess_text(self.input_text.get("1.0", tk.END))
+        # Текст изменён после анализа: ищем слово только в строке под курсором
+        start_char = column
+        text = preprocess_text(self.input_text.get(f"{line}.0", f"{line}.end"))
         if not (start_char >= 0 and start_char < len(text)):
             return ""
         end_char = start_char
@@ -413,25 +447,35 @@ class DuplicateWordFinder(tk.Tk):
             start_char -= 1
         while end_char < len(text) and (text[end_char].isalnum() or text[end_char] == "_" or text[end_char] == "-"):
             end_char += 1
-        return self.stemmer.stem(text[start_char:end_char])
+        if self.analyzer is None:
+            return ""  # Анализа ещё не было, выделять нечего
+        return self.analyzer.stem(text[start_char:end_char])
 
     def highlight_word(self, event=None):
         if event:
             selected_word = ""
-            if event.widget == self.output_listbox:
+            if event.widget == self.output_listbox.listbox:
                 # Получаем позицию клика
                 line_number = self.output_listbox.nearest(event.y)
                 if 0 <= line_number < len(self.sorted_words):
-                    selected_word = self.sorted_words[line_number][0]
+                    selected_word = self.sorted_words.rows(line_number, 1)[0][0]
+                    self.output_listbox.selection_set(line_number)  # Запоминаем выделение для прокрутки
+                if self.sort_type == "phrases":
+                    # В списке фразы: подсвечиваем все вхождения выбранной
+                    self.update_highlight()
+                    self.select_phrase(self.phrases.get(selected_word))
+                    return
             if event.widget == self.input_text:
                 selected_word = self.get_clicked_word(event)
+                self.select_phrase(None)
                 # Установка выделения в output_listbox
-                self.output_listbox.selection_clear(0, tk.END)  # Сначала снимаем все выделения
-                for i, (word, _) in enumerate(self.sorted_words):
-                    if word == selected_word:
-                        self.output_listbox.selection_set(i)
-                        self.output_listbox.see(i)  # Прокручиваем к выделенному элементу
-                        break
+                self.output_listbox.selection_clear()  # Сначала снимаем все выделения
+                row = None
+                if selected_word and self.sorted_words and self.sort_type != "phrases":
+                    row = self.sorted_words.index(selected_word)
+                if row is not None:
+                    self.output_listbox.selection_set(row)
+                    self.output_listbox.see(row)  # Прокручиваем к выделенному элементу
 
             if selected_word in self.word_info:
                 self.update_highlight(selected_word)
@@ -441,6 +485,9 @@ class DuplicateWordFinder(tk.Tk):
     def calculate_intensity(self, word):
         # Рассчитываем интенсивность на основе минимального расстояния
         min_distance = self.word_info.get(word, WordInfo(0,self.text_length,False)).min_distance
+        return self.distance_intensity(min_distance)
+
+    def distance_intensity(self, min_distance):
         if min_distance == self.text_length:
             normalized_intensity = 255  # если одно вхождение
         else:
@@ -448,18 +495,166 @@ class DuplicateWordFinder(tk.Tk):
             normalized_intensity = max(1, min(normalized_intensity * 8, 255))  # ограничение
         return normalized_intensity
 
+    def highlight_color(self, word):
+        intensity = self.calculate_intensity(word)
+        if word == self.selected_word:
+            return self.get_mark(intensity)
+        if (self.word_info[word].is_stopword and self.highlight_mode.stop_word):
+            return self.get_stop(intensity)
+        if self.highlight_mode.repeat_word:
+            return self.get_repeat(intensity)
+        return "#FFFFFF"
+
     def update_highlight(self, select_word=""):
-        for word, values in self.word_info.items():
-            intensity = self.calculate_intensity(word)
-            if word == select_word:
-                hex_color = self.get_mark(intensity)
-            elif (values.is_stopword and self.highlight_mode.stop_word):
-                hex_color = self.get_stop(intensity)
-            elif self.highlight_mode.repeat_word:
-                hex_color = self.get_repeat(intensity)
-            else:
-                hex_color = "#FFFFFF"
+        # Перекрашиваем только уже размеченные теги, остальные получат цвет при разметке
+        self.selected_word = select_word
+        with metrics.stage("update_highlight"):
+            for word, color in self.highlight_tags.items():
+                hex_color = self.highlight_color(word)
+                if hex_color != color:
+                    self.input_text.tag_config(word, background=hex_color)
+                    self.highlight_tags[word] = hex_color
+                    metrics.count("tk_calls")
+
+    def select_phrase(self, phrase):
+        """Подсвечивает все вхождения фразы поверх подсветки слов (None — снять)."""
+        self.input_text.tag_remove(PHRASE_TAG, "1.0", tk.END)
+        self.selected_phrase = phrase
+        if phrase is None or self.highlight_stale:
+            return
+        indexes = []
+        for start, end in zip(phrase.starts, phrase.ends):
+            indexes.append(self.text_index(start))
+            indexes.append(self.text_index(end))
+        self.input_text.tag_config(PHRASE_TAG, background=self.get_mark(self.distance_intensity(phrase.min_distance)))
+        self.input_text.tag_add(PHRASE_TAG, *indexes)
+        self.input_text.tag_raise(PHRASE_TAG)
+        self.input_text.see(indexes[0])
+        metrics.count("tk_calls", 4)
+
+    def input_scrolled(self, first, last):
+        self.input_scroll.set(first, last)
+        if not self.highlight_refresh_job:
+            self.highlight_refresh_job = self.after_idle(self.refresh_highlight)
+
+    def text_index(self, offset):
+        """Индекс Tk вида «строка.столбец» для смещения в тексте (без обхода текста от начала)."""
+        line = bisect.bisect_right(self.line_starts, offset) - 1
+        return f"{line + 1}.{offset - self.line_starts[line]}"
+
+    def visible_range(self, margin_lines=0):
+        """Смещения начала и конца видимых строк текста с запасом margin_lines."""
+        first_line = int(self.input_text.index("@0,0").split(".")[0]) - 1 - margin_lines
+        last_line = int(self.input_text.index(f"@0,{self.input_text.winfo_height()}").split(".")[0]) + margin_lines
+        start = self.line_starts[max(0, min(first_line, len(self.line_starts) - 1))]
+        end = self.line_starts[last_line] if last_line < len(self.line_starts) else self.text_size
+        return start, end
+
+    def refresh_highlight(self):
+        """Размечает вхождения около видимой области, если она вышла за уже размеченную."""
+        self.highlight_refresh_job = None
+        if self.highlight_stale or not self.line_starts:
+            return
+        with metrics.stage("refresh_highlight"):
+            self.retag_visible()
+
+    def retag_visible(self):
+        if self.highlight_range:
+            start, end = self.visible_range()
+            if self.highlight_range[0] <= start and end <= self.highlight_range[1]:
+                return
+        start, end = self.visible_range(HIGHLIGHT_MARGIN_LINES)
+
+        # Снимаем старую разметку одним вызовом
+        if self.highlight_batch_job:
+            self.after_cancel(self.highlight_batch_job)
+            self.highlight_batch_job = None
+        if self.highlight_tags:
+            self.input_text.tag_delete(*self.highlight_tags)
+            metrics.count("tk_calls")
+        self.highlight_tags = {}
+        self.highlight_range = (start, end)
+
+        # Собираем все диапазоны каждой основы, чтобы разметить их одним tag_add
+        ranges = {}
+        first = bisect.bisect_left(self.highlight_starts, start)
+        last = bisect.bisect_left(self.highlight_starts, end)
+        for i in range(first, last):
+            indexes = ranges.setdefault(self.highlight_stems[i], [])
+            indexes.append(self.text_index(self.highlight_starts[i]))
+            indexes.append(self.text_index(self.highlight_ends[i]))
+        self.pending_highlights = list(ranges.items())
+        self.apply_highlight_batch()
+
+    def apply_highlight_batch(self):
+        # Размечаем, пока не исчерпан бюджет кадра; остаток — в следующем кадре
+        self.highlight_batch_job = None
+        start = time.perf_counter()
+        deadline = start + HIGHLIGHT_FRAME_BUDGET
+        tagged = 0
+        while self.pending_highlights:
+            word, indexes = self.pending_highlights.pop()
+            hex_color = self.highlight_color(word)
             self.input_text.tag_config(word, background=hex_color)
+            self.input_text.tag_add(word, *indexes)
+            self.highlight_tags[word] = hex_color
+            tagged += 1
+            if time.perf_counter() > deadline:
+                break
+        if self.selected_phrase is not None:
+            self.input_text.tag_raise(PHRASE_TAG)  # Новые теги слов создаются поверх фразы
+        if self.pending_highlights:
+            self.highlight_batch_job = self.after(1, self.apply_highlight_batch)
+        if metrics.enabled:
+            metrics.record("highlight_frame", time.perf_counter() - start)
+            metrics.count("tk_calls", tagged * 2)
+            self.update_status()
+
+    def toggle_metrics(self):
+        metrics.enabled = self.metrics_var.get()
+        metrics.reset()
+        self.update_status()
+
+    def save_metrics(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if path:
+            metrics.dump_json(path)
+
+    def toggle_tokenizer(self):
+        self.tokenizer = "regex" if self.fast_tokenizer_var.get() else "punkt"
+        self.text_modified()
+
+    def clear_cache(self):
+        analyzer = self.analyzer
+        if analyzer is not None and analyzer.cache is not None:
+            analyzer.cache.clear()
+
+    def update_status(self):
+        self.status_label.config(text=metrics.summary() if metrics.enabled else "")
+
+    def text_modified(self, event=None):
+        if event:
+            if not self.input_text.edit_modified():
+                return  # Событие от сброса флага изменений
+            self.input_text.edit_modified(False)
+            self.cancel_analysis()  # Результат для старого текста уже не нужен
+            self.highlight_stale = True  # Новые вхождения не размечаем по старым смещениям
+            self.selected_phrase = None
+            # Индексы неразмеченных пачек посчитаны по старому тексту
+            if self.highlight_batch_job:
+                self.after_cancel(self.highlight_batch_job)
+                self.highlight_batch_job = None
+            self.pending_highlights = []
+        if self.live_analysis_job:
+            self.after_cancel(self.live_analysis_job)
+            self.live_analysis_job = None
+        if self.live_analysis_var.get():
+            # Анализируем, когда пользователь сделал паузу в наборе
+            self.live_analysis_job = self.after(LIVE_ANALYSIS_DELAY_MS, self.live_analysis)
+
+    def live_analysis(self):
+        self.live_analysis_job = None
+        self.analyze_text(live=True)
 
     def update_highlight_options(self):
         self.highlight_mode.repeat_word = self.repeat_word_var.get()
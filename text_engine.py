@@ -0,0 +1,842 @@
+import bisect
+import functools
+import hashlib
+import logging
+import mmap
+import os
+import re
+import sys
+import threading
+
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field, fields, asdict
+from instrumentation import metrics
+from readability import calculate_flesch_index, calculate_fog_index, count_readability
+
+# Локальная копия данных NLTK для машин без интернета:
+#   python -m nltk.downloader -d nltk_data punkt punkt_tab stopwords
+BUNDLED_NLTK_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data")
+
+_nltk_lock = threading.Lock()
+_nltk_loaded = False
+
+
+def ensure_nltk_data():
+    """Проверяет наличие ресурсов NLTK и при необходимости скачивает их."""
+    import nltk
+
+    try:
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        logging.info("Downloading necessary punkt data...")
+        nltk.download('punkt')
+
+    try:
+        nltk.data.find('tokenizers/punkt_tab')
+    except LookupError:
+        logging.info("Downloading necessary punkt_tab data...")
+        nltk.download('punkt_tab')
+
+    try:
+        nltk.data.find('corpora/stopwords')
+    except LookupError:
+        logging.info("Downloading necessary stopwords data...")
+        nltk.download('stopwords')
+
+
+def load_nltk():
+    """Импортирует NLTK и проверяет его ресурсы при первом анализе, а не при запуске программы.
+
+    Сначала данные ищутся в BUNDLED_NLTK_DATA, затем в стандартных каталогах NLTK;
+    скачиваются, только если их нет нигде.
+    """
+    global _nltk_loaded
+    with _nltk_lock:
+        if not _nltk_loaded:
+            import nltk
+            if os.path.isdir(BUNDLED_NLTK_DATA) and BUNDLED_NLTK_DATA not in nltk.data.path:
+                nltk.data.path.insert(0, BUNDLED_NLTK_DATA)
+            ensure_nltk_data()
+            _nltk_loaded = True
+
+STEM_CACHE_SIZE = 200_000  # Сколько словоформ помнит кэш стемминга
+_stem_functions = {}
+
+
+def get_stem_function(language="russian"):
+    """Стеммер с LRU-кэшем, общий для всего процесса.
+
+    Словоформы в тексте сильно повторяются, поэтому почти все вызовы берутся из кэша.
+    Статистика попаданий доступна через .cache_info().
+    """
+    stem = _stem_functions.get(language)
+    if stem is None:
+        load_nltk()
+        from nltk.stem import SnowballStemmer
+        stem = functools.lru_cache(maxsize=STEM_CACHE_SIZE)(SnowballStemmer(language).stem)
+        _stem_functions[language] = stem
+    return stem
+
+
+
+class AnalysisCancelled(Exception):
+    """Анализ прерван: текст изменился или анализ запущен заново."""
+
+
+@dataclass
+class WordInfo:
+    __slots__ = ("count", "min_distance", "is_stopword")
+    count: int
+    min_distance: int
+    is_stopword: bool
+
+
+@dataclass
+class TokenStream:
+    """Результат единственной токенизации текста, общий для всех метрик.
+
+    Словоформы интернированы (одна строка на словоформу), числа хранятся в array('i').
+    """
+    __slots__ = ("words", "starts", "ends", "sentence_starts")
+    words: list             # словоформы после preprocess_text
+    starts: array           # смещение начала каждого слова в тексте
+    ends: array             # смещение конца каждого слова в тексте
+    sentence_starts: array  # номер первого слова каждого предложения
+
+    @property
+    def sentence_count(self):
+        return len(self.sentence_starts)
+
+
+@dataclass
+class PhraseInfo:
+    """Повторяющаяся фраза из нескольких основ подряд."""
+    text: str           # фраза так, как она написана при первом вхождении
+    stems: tuple
+    count: int
+    min_distance: int   # в словах, между началами соседних вхождений
+    starts: array = field(repr=False)  # смещения начала и конца каждого вхождения в тексте
+    ends: array = field(repr=False)
+
+
+_POSITION_FIELDS = ("highlight_stems", "highlight_starts", "highlight_ends", "line_starts")
+
+
+@dataclass
+class AnalysisResult:
+    word_info: dict
+    char_count: int
+    char_count_no_spaces: int
+    word_count: int
+    text_length: int
+    flesch_index: float
+    fog_index: float
+    diversity_percentage: float
+    water_percentage: float
+    spam_percentage: float
+    # Подсвечиваемые вхождения по возрастанию смещения: основа, начало и конец в тексте
+    highlight_stems: list = field(default_factory=list, repr=False)
+    highlight_starts: array = field(default_factory=lambda: array("i"), repr=False)
+    highlight_ends: array = field(default_factory=lambda: array("i"), repr=False)
+    line_starts: array = field(default_factory=lambda: array("i"), repr=False)  # смещение начала каждой строки
+    phrases: list = field(default=None, repr=False)  # PhraseInfo (см. find_repeated_phrases) или None, если не искались
+
+    def to_dict(self):
+        """Словарь для сериализации в JSON (без позиций подсветки и вхождений фраз)."""
+        result = {item.name: getattr(self, item.name) for item in fields(self) if item.name not in _POSITION_FIELDS}
+        result["word_info"] = {stem: asdict(info) for stem, info in self.word_info.items()}
+        result["phrases"] = None if self.phrases is None else [
+            {"text": phrase.text, "stems": list(phrase.stems), "count": phrase.count, "min_distance": phrase.min_distance}
+            for phrase in self.phrases
+        ]
+        return result
+
+
+def preprocess_text(text):
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # Редкие символы меняют длину при lower(), а смещения слов должны совпадать с исходным текстом
+        lowered = "".join(char if len(char.lower()) != 1 else char.lower() for char in text)
+    text = lowered
+    text = re.sub(r'[^\w\s\-]', ' ', text)  # Keep hyphens
+    return text
+
+
+def calculate_percentage(a, b):
+    if b < 1:
+        return 0
+    return (a / b) * 100
+
+
+@functools.lru_cache(maxsize=None)
+def get_sentence_tokenizer(language="russian"):
+    load_nltk()
+    from nltk.tokenize.punkt import PunktTokenizer
+    return PunktTokenizer(language)
+
+
+@functools.lru_cache(maxsize=None)
+def get_word_tokenizer():
+    load_nltk()
+    from nltk.tokenize.destructive import NLTKWordTokenizer
+    return NLTKWordTokenizer()
+
+
+# Слова в тексте после preprocess_text: буквы, цифры и дефисы внутри слова, а «--» отдельно,
+# как их делит NLTKWordTokenizer
+_WORD_RE = re.compile(r"--|(?:\w|-(?!-))+")
+# Возможный конец предложения: знаки . ! ? … с закрывающими кавычками и скобками, пробел,
+# затем необязательные открывающие кавычки или тире; группа — первый символ следующего слова.
+# Совпадение начинается только с первого знака серии, а пробелы берутся все сразу: иначе
+# на длинных сериях точек или пробелов поиск возвращается назад и становится квадратичным
+_SENTENCE_END_RE = re.compile(r"(?<![.!?…])[.!?…]+[\"'»”’)\]]*\s+(?!\s)(?=[\"'«„“(\[—–-]*\s*(\w))")
+
+
+def punkt_tokenize(text, language="russian"):
+    """Токенизация NLTK: предложения — punkt, слова — NLTKWordTokenizer.
+
+    Предложения ищутся в исходном тексте (там сохранена пунктуация), а слова — в
+    тех же фрагментах текста после preprocess_text, длина которого не меняется.
+    """
+    processed_text = preprocess_text(text)
+    word_tokenizer = get_word_tokenizer()
+    intern = sys.intern
+    words = []
+    starts = array("i")
+    ends = array("i")
+    sentence_starts = array("i")
+    for sentence_start, sentence_end in get_sentence_tokenizer(language).span_tokenize(text):
+        sentence_starts.append(len(words))
+        sentence = processed_text[sentence_start:sentence_end]
+        for word_start, word_end in word_tokenizer.span_tokenize(sentence):
+            words.append(intern(sentence[word_start:word_end]))
+            starts.append(sentence_start + word_start)
+            ends.append(sentence_start + word_end)
+    return TokenStream(words, starts, ends, sentence_starts)
+
+
+def regex_tokenize(text, language="russian"):
+    """Токенизация заранее скомпилированными регулярными выражениями, без NLTK.
+
+    Слова делятся так же, как в punkt_tokenize. Предложение кончается на . ! ? или …,
+    если дальше идёт слово с заглавной буквы или цифры. Точку после однобуквенного
+    слова, как и punkt, считаем точкой инициала, а не концом предложения. Списка
+    сокращений, как у обученного punkt, здесь нет, поэтому число предложений может
+    немного отличаться; насколько — показывает benchmark.py tokenizers.
+    """
+    processed_text = preprocess_text(text)
+    intern = sys.intern
+    words = []
+    starts = array("i")
+    ends = array("i")
+    for match in _WORD_RE.finditer(processed_text):
+        words.append(intern(match.group()))
+        starts.append(match.start())
+        ends.append(match.end())
+    sentence_starts = array("i")
+    if text and not text.isspace():
+        sentence_starts.append(0)
+        for match in _SENTENCE_END_RE.finditer(text):
+            next_char = match.group(1)
+            if not (next_char.isupper() or next_char.isdigit()):
+                continue
+            end = match.start()
+            if text[end] == "." and end > 0 and text[end - 1].isalpha() and (end == 1 or not text[end - 2].isalnum()):
+                continue  # Инициал
+            sentence_starts.append(bisect.bisect_left(starts, match.end()))
+    return TokenStream(words, starts, ends, sentence_starts)
+
+
+def ends_sentence(text):
+    """Заканчивается ли текст знаком конца предложения (после него могут быть кавычки, скобки, пробелы).
+
+    Как и в токенизаторах, точка после однобуквенного слова считается точкой инициала.
+    """
+    text = text.rstrip().rstrip("\"'»”’)]")
+    if not text.endswith((".", "!", "?", "…")):
+        return False
+    return not (text[-1] == "." and len(text) > 1 and text[-2].isalpha() and (len(text) == 2 or not text[-3].isalnum()))
+
+
+# Токенизаторы по имени: punkt — эталонный, regex — быстрый
+TOKENIZERS = {"punkt": punkt_tokenize, "regex": regex_tokenize}
+
+
+def tokenize(text, language="russian", tokenizer="punkt"):
+    """Токенизирует текст один раз: слова, их смещения и границы предложений."""
+    return TOKENIZERS[tokenizer](text, language)
+
+
+STREAM_CHUNK_SIZE = 1 << 20  # Размер куска при потоковом анализе файла, байт
+CHECK_INTERVAL_WORDS = 10_000  # Как часто длинный абзац проверяет отмену и сообщает прогресс
+NO_DISTANCE = sys.maxsize  # Минимальное расстояние основы, встреченной один раз
+
+
+class StemTable(dict):
+    """Номера основ: основа -> номер по порядку появления, stems[номер] -> основа.
+
+    Буферы анализа хранят номера вместо строк. Новый номер выдаётся при первом
+    обращении table[основа], обращения к известным основам идут напрямую в dict.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.stems = []
+        self.lock = threading.Lock()  # Отменённый анализ может ещё работать в другом потоке
+
+    def __missing__(self, stem):
+        with self.lock:
+            stem_id = self.get(stem)
+            if stem_id is None:
+                stem_id = len(self.stems)
+                self.stems.append(stem)
+                self[stem] = stem_id
+            return stem_id
+
+
+class StemStats:
+    """Статистика основ фрагмента из count_stems, сложенная в столбцы array.
+
+    Занимает около 24 байт на основу вместо словаря списков; items() отдаёт те же
+    пары (основа, (кол-во, первая, последняя, мин. расстояние)), что и словарь.
+    """
+    __slots__ = ("stem_ids", "counts", "firsts", "lasts", "min_distances")
+
+    def __init__(self, word_stats):
+        self.stem_ids = array("i", word_stats)
+        columns = zip(*word_stats.values()) if word_stats else ((), (), (), ())
+        counts, firsts, lasts, min_distances = columns
+        self.counts = array("i", counts)
+        self.firsts = array("i", firsts)
+        self.lasts = array("i", lasts)
+        self.min_distances = array("q", min_distances)  # NO_DISTANCE не помещается в 'i'
+
+    def __len__(self):
+        return len(self.stem_ids)
+
+    def items(self):
+        return zip(self.stem_ids, zip(self.counts, self.firsts, self.lasts, self.min_distances))
+
+
+def count_stems(stemmed_words):
+    """Один проход по тексту: для каждой основы [кол-во, первая позиция, последняя позиция, мин. расстояние].
+
+    Расстояние считается в словах; пока основа встретилась один раз, минимальное
+    расстояние равно NO_DISTANCE.
+    """
+    word_stats = {}
+    for i, stemmed_word in enumerate(stemmed_words):
+        stats = word_stats.get(stemmed_word)
+        if stats is None:
+            word_stats[stemmed_word] = [1, i, i, NO_DISTANCE]
+        else:
+            distance = i - stats[2]
+            if distance < stats[3]:
+                stats[3] = distance
+            stats[0] += 1
+            stats[2] = i
+    return word_stats
+
+
+def merge_stem_stats(word_stats, part_stats, offset):
+    """Добавляет к word_stats статистику фрагмента, который начинается со слова номер offset."""
+    for stemmed_word, (count, first, last, min_distance) in part_stats.items():
+        stats = word_stats.get(stemmed_word)
+        if stats is None:
+            word_stats[stemmed_word] = [count, first + offset, last + offset, min_distance]
+        else:
+            # Расстояние на стыке: от последнего вхождения до первого во фрагменте
+            distance = first + offset - stats[2]
+            stats[0] += count
+            stats[2] = last + offset
+            stats[3] = min(stats[3], min_distance, distance)
+
+
+PHRASE_MAX_WORDS = 8  # Самая длинная повторяющаяся фраза, в словах
+
+
+def find_repeated_phrases(stem_ids, stop_ids, max_words=PHRASE_MAX_WORDS):
+    """Повторяющиеся фразы из 2..max_words основ: список (длина, номера начал вхождений).
+
+    stem_ids — номера основ подряд, -1 отделяет абзацы (фраза через него не переходит).
+    Сначала вхождения группируются по паре основ (ключи пар считает Counter), затем
+    каждая повторяющаяся группа делится по следующей основе; группы из одного
+    вхождения дальше не рассматриваются, поэтому работа занимает O(N * max_words)
+    без сравнения фраз между собой.
+    Не выдаются фразы только из стоп-слов и фразы, все вхождения которых одинаково
+    продолжаются вправо или влево: они входят в более длинную повторяющуюся фразу.
+    """
+    size = len(stem_ids)
+    if size < 2:
+        return []
+    width = max(stem_ids) + 2
+    # Ключ пары a * width + b; пары с границей абзаца дают ключ < 0 или остаток width - 1
+    pair_keys = [a * width + b for a, b in zip(stem_ids, stem_ids[1:])]
+    repeated = {key for key, count in Counter(pair_keys).items() if count > 1 and key >= 0 and key % width != width - 1}
+    groups = {}
+    for i, key in enumerate(pair_keys):
+        if key in repeated:
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [i]
+            else:
+                group.append(i)
+    level = list(groups.values())
+    phrases = []
+    for length in range(2, max_words + 1):
+        next_level = []
+        for starts in level:
+            longer = []
+            if length < max_words:
+                continuations = {}
+                for start in starts:
+                    end = start + length
+                    if end < size and stem_ids[end] >= 0:
+                        continuations.setdefault(stem_ids[end], []).append(start)
+                longer = [group for group in continuations.values() if len(group) > 1]
+                next_level.extend(longer)
+            if any(len(group) == len(starts) for group in longer):
+                continue  # Все вхождения продолжаются одинаково
+            previous = stem_ids[starts[0] - 1] if starts[0] else -1
+            if previous >= 0 and all(stem_ids[start - 1] == previous for start in starts):
+                continue  # Все вхождения начинаются после одной и той же основы
+            if all(stem_ids[i] in stop_ids for i in range(starts[0], starts[0] + length)):
+                continue
+            phrases.append((length, starts))
+        level = next_level
+    return phrases
+
+
+@dataclass
+class ParagraphAnalysis:
+    """Всё, что зависит только от текста абзаца; смещения и номера слов — внутри абзаца.
+
+    Основы хранятся номерами из StemTable анализатора. ends_sentence — абзац
+    заканчивается знаком конца предложения; если нет, его последнее предложение
+    продолжается в следующем абзаце (текст с переносами строк из PDF или письма).
+    """
+    __slots__ = ("tokens", "stem_ids", "word_stats", "syllables", "hard_words", "ends_sentence")
+    tokens: TokenStream
+    stem_ids: array
+    word_stats: StemStats
+    syllables: int
+    hard_words: int
+    ends_sentence: bool
+
+
+STEM_TABLE_MIN_SIZE = 10_000  # Меньшую таблицу основ инкрементальный анализ не перестраивает
+
+
+def renumber_stems(paragraph_cache, stems):
+    """Кэш абзацев с новой StemTable только из их основ: (новый кэш, новая таблица).
+
+    Старые ParagraphAnalysis не меняются: их может ещё читать отменённый анализ.
+    """
+    stem_table = StemTable()
+    renumbered = {}
+    for paragraph_text, paragraph in paragraph_cache.items():
+        stem_ids = array("i", [stem_table[stems[stem_id]] for stem_id in paragraph.stem_ids])
+        renumbered[paragraph_text] = ParagraphAnalysis(
+            tokens = paragraph.tokens,
+            stem_ids = stem_ids,
+            word_stats = StemStats(count_stems(stem_ids)),
+            syllables = paragraph.syllables,
+            hard_words = paragraph.hard_words,
+            ends_sentence = paragraph.ends_sentence
+        )
+    return renumbered, stem_table
+
+
+class AnalysisAccumulator:
+    """Итоги анализа, которые складываются по абзацам без хранения самих слов.
+
+    Аккумуляторы соседних фрагментов текста объединяются через merge(), поэтому
+    большой текст можно разбирать кусками с постоянным расходом памяти
+    (растёт только словарь основ).
+    """
+
+    def __init__(self):
+        self.word_stats = {}  # номер основы -> [кол-во, первая позиция, последняя позиция, мин. расстояние]
+        self.num_words = 0
+        self.num_sentences = 0
+        self.open_sentence = False  # последнее предложение не закончено и продолжится в следующем абзаце
+        self.num_syllables = 0
+        self.hard_words = 0
+        self.char_count = 0
+        self.char_count_no_spaces = 0
+
+    def add_paragraph(self, paragraph):
+        merge_stem_stats(self.word_stats, paragraph.word_stats, self.num_words)
+        self.num_words += len(paragraph.stem_ids)
+        sentences = paragraph.tokens.sentence_count
+        if sentences:
+            if self.open_sentence:
+                sentences -= 1  # Первое предложение абзаца — продолжение незаконченного
+            self.open_sentence = not paragraph.ends_sentence
+        self.num_sentences += sentences
+        self.num_syllables += paragraph.syllables
+        self.hard_words += paragraph.hard_words
+
+    def add_chars(self, text):
+        self.char_count += len(text)
+        self.char_count_no_spaces += len(text) - text.count(" ")
+
+    def merge(self, other):
+        """Добавляет итоги фрагмента, который идёт в тексте сразу после уже учтённых."""
+        merge_stem_stats(self.word_stats, other.word_stats, self.num_words)
+        self.num_words += other.num_words
+        if other.num_sentences:
+            self.num_sentences += other.num_sentences - self.open_sentence
+            self.open_sentence = other.open_sentence
+        self.num_syllables += other.num_syllables
+        self.hard_words += other.hard_words
+        self.char_count += other.char_count
+        self.char_count_no_spaces += other.char_count_no_spaces
+
+    def result(self, stems, stemmed_stop_words):
+        """AnalysisResult по накопленным итогам (без позиций подсветки); stems[номер] -> основа."""
+        num_words = self.num_words
+        text_length = max(num_words, 100)  # Минимальная длина текста для нормировки
+
+        word_info = {}
+        unique_count = 0
+        stop_count = 0
+        max_frec = 0
+        for stem_id, (wcount, _, _, min_distance) in self.word_stats.items():
+            stemmed_word = stems[stem_id]
+            is_stop_word = stemmed_word in stemmed_stop_words
+            if wcount == 1:  # считаем уникальные слова
+                unique_count = unique_count + 1
+            if is_stop_word:  # считаем стоп слова
+                stop_count = stop_count + wcount
+            elif max_frec < wcount:
+                max_frec = wcount
+            if (wcount > 1 or is_stop_word):
+                word_info[stemmed_word] = WordInfo(
+                    count = wcount,
+                    min_distance = min(min_distance, text_length),
+                    is_stopword = is_stop_word
+                )
+
+        with metrics.stage("flesch"):
+            flesch_index = calculate_flesch_index(self.num_sentences, num_words, self.num_syllables)
+        with metrics.stage("fog"):
+            fog_index = calculate_fog_index(self.num_sentences, num_words, self.hard_words)
+
+        return AnalysisResult(
+            word_info = word_info,
+            char_count = self.char_count,
+            char_count_no_spaces = self.char_count_no_spaces,
+            word_count = num_words,
+            text_length = text_length,
+            flesch_index = flesch_index,
+            fog_index = fog_index,
+            diversity_percentage = calculate_percentage(unique_count, num_words - stop_count),
+            water_percentage = calculate_percentage(stop_count, num_words),
+            spam_percentage = calculate_percentage(max_frec, num_words - stop_count)
+        )
+
+
+class TextAnalyzer:
+    """Анализ текста без привязки к интерфейсу: строка на входе, AnalysisResult на выходе.
+
+    Текст разбирается по абзацам (строкам). С incremental=True результаты абзацев
+    запоминаются по их тексту, и при повторном анализе заново токенизируются и
+    стеммируются только изменённые абзацы. Номера основ абзацев из кэша берутся из
+    общей StemTable; когда в ней накапливается намного больше основ, чем есть в
+    текущем тексте, кэш перенумеровывается. Без incremental таблица своя у каждого
+    вызова, и долгоживущий процесс не копит основы всех прочитанных текстов.
+
+    cache — хранилище готовых результатов с методами get(key) и put(key, result),
+    например analysis_cache.AnalysisCache: если текст уже анализировался с теми же
+    настройками, результат берётся оттуда.
+
+    tokenizer — имя токенизатора из TOKENIZERS: "punkt" (NLTK) или "regex".
+    """
+
+    def __init__(self, language="russian", incremental=False, cache=None, tokenizer="punkt"):
+        if tokenizer not in TOKENIZERS:
+            raise ValueError(f"Unknown tokenizer: {tokenizer}")
+        self.language = language
+        self.tokenizer = tokenizer
+        self.tokenize = TOKENIZERS[tokenizer]
+        self.incremental = incremental
+        self.cache = cache
+        # Всё, что нужно от NLTK, загружается здесь, при создании анализатора
+        load_nltk()
+        from nltk.corpus import stopwords
+        self.stem = get_stem_function(language)
+        if tokenizer == "punkt":
+            get_sentence_tokenizer(language)
+            get_word_tokenizer()
+        # Стоп-слова (можно расширить)
+        self.stop_words = set(stopwords.words(language))
+        # Основы стоп-слов строятся один раз, а не при каждом анализе
+        self.stemmed_stop_words = frozenset(self.stem(word) for word in self.stop_words)
+        self.paragraph_cache = {}  # текст абзаца -> ParagraphAnalysis
+        self.stem_table = StemTable()  # Номера основ paragraph_cache
+        self.state_lock = threading.Lock()  # Кэш абзацев и таблица меняются только вместе
+        # Всё, от чего зависит результат, кроме текста: смена любой настройки меняет ключ кэша
+        import nltk
+        config = [language, "snowball", tokenizer, nltk.__version__, *sorted(self.stop_words)]
+        self.config_digest = hashlib.sha256("\n".join(config).encode("utf-8")).digest()
+
+    def cache_key(self, text):
+        """Ключ результата анализа text в кэше: хэш текста и настроек анализатора."""
+        digest = hashlib.sha256(self.config_digest)
+        digest.update(text.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def stem_cache_info(self):
+        """Попадания/промахи кэша стемминга."""
+        return self.stem.cache_info()
+
+    def analyze_paragraph(self, paragraph, stem_table, check=None):
+        """ParagraphAnalysis абзаца; номера основ выдаются из stem_table.
+
+        check(position) вызывается каждые CHECK_INTERVAL_WORDS слов со смещением
+        очередного слова в абзаце: через него длинный абзац (например, вставленный
+        одной строкой) сообщает прогресс и прерывается исключением.
+        """
+        with metrics.stage("tokenize"):
+            tokens = self.tokenize(paragraph, self.language)
+        with metrics.stage("stem"):
+            stem = self.stem
+            words = tokens.words
+            stem_ids = array("i")
+            for first in range(0, len(words), CHECK_INTERVAL_WORDS):
+                if check is not None and first:
+                    check(tokens.starts[first])
+                stem_ids.extend([stem_table[stem(word)] for word in words[first:first + CHECK_INTERVAL_WORDS]])
+        with metrics.stage("frequency"):
+            word_stats = StemStats(count_stems(stem_ids))
+        with metrics.stage("readability"):
+            syllables, hard_words = count_readability(tokens.words)
+        return ParagraphAnalysis(
+            tokens = tokens,
+            stem_ids = stem_ids,
+            word_stats = word_stats,
+            syllables = syllables,
+            hard_words = hard_words,
+            ends_sentence = ends_sentence(paragraph)
+        )
+
+    def analyze(self, text, progress=None, cancel=None, phrases=True, store=True):
+        """Анализирует текст.
+
+        progress(done, total) получает разобранные и все символы текста; вызывается
+        не чаще раза на процент, в том числе внутри длинного абзаца.
+        cancel — threading.Event: если он установлен, анализ прерывается AnalysisCancelled.
+        Поиск фраз проходит по всему тексту даже при инкрементальном анализе, поэтому
+        с phrases=False он пропускается и result.phrases остаётся None.
+        С store=False результат берётся из кэша, но не записывается в него: промежуточные
+        версии текста при анализе во время ввода больше не откроют, а место в кэше они займут.
+        """
+        with metrics.stage("analyze"):
+            key = None
+            if self.cache is not None:
+                key = self.cache_key(text)
+                result = self.cache.get(key)
+                if result is not None and (result.phrases is not None or not phrases):
+                    metrics.count("analysis_cache_hits")
+                    return result
+                metrics.count("analysis_cache_misses")
+            result = self._analyze(text, progress, cancel, phrases)
+            if key is not None and store:
+                self.cache.put(key, result)
+        return result
+
+    def _analyze(self, text, progress, cancel, phrases):
+        cache_before = self.stem.cache_info()
+        # Абзацы: старые берём из кэша, новые и изменённые разбираем заново
+        paragraph_texts = text.split("\n")
+        total = len(text) or 1
+        reported = 0
+        if self.incremental:
+            with self.state_lock:
+                previous_cache, stem_table = self.paragraph_cache, self.stem_table
+        else:
+            previous_cache, stem_table = {}, StemTable()
+        paragraph_cache = {}
+        paragraphs = []  # (смещение абзаца в тексте, ParagraphAnalysis)
+        totals = AnalysisAccumulator()
+        offset = 0
+
+        def check(position):
+            # Отмена и прогресс; position — смещение в текущем абзаце
+            nonlocal reported
+            if cancel is not None and cancel.is_set():
+                raise AnalysisCancelled()
+            done = offset + position
+            if progress is not None and (done - reported) * 100 >= total:
+                reported = done
+                progress(done, total)
+
+        for paragraph_text in paragraph_texts:
+            paragraph = paragraph_cache.get(paragraph_text) or previous_cache.get(paragraph_text)
+            if paragraph is None:
+                check(0)
+                paragraph = self.analyze_paragraph(paragraph_text, stem_table, check)
+                metrics.count("paragraphs_analyzed")
+            paragraph_cache[paragraph_text] = paragraph
+            paragraphs.append((offset, paragraph))
+            totals.add_paragraph(paragraph)
+            offset += len(paragraph_text) + 1
+        if cancel is not None and cancel.is_set():
+            raise AnalysisCancelled()
+
+        totals.add_chars(text)
+        stems = stem_table.stems
+        result = totals.result(stems, self.stemmed_stop_words)
+
+        with metrics.stage("positions"):
+            word_info = result.word_info
+            highlighted = {stem_table[stem] for stem in word_info}
+            for offset, paragraph in paragraphs:
+                result.line_starts.append(offset)
+                tokens = paragraph.tokens
+                for stem_id, start, end in zip(paragraph.stem_ids, tokens.starts, tokens.ends):
+                    if stem_id in highlighted:
+                        result.highlight_stems.append(stems[stem_id])
+                        result.highlight_starts.append(offset + start)
+                        result.highlight_ends.append(offset + end)
+
+        if phrases:
+            with metrics.stage("phrases"):
+                result.phrases = self.find_phrases(text, paragraphs, stem_table)
+
+        if self.incremental:
+            # Основы удалённых абзацев остаются в таблице, пока её не перестроить
+            if len(stem_table) > max(STEM_TABLE_MIN_SIZE, 2 * len(totals.word_stats)):
+                paragraph_cache, stem_table = renumber_stems(paragraph_cache, stems)
+            with self.state_lock:
+                if cancel is not None and cancel.is_set():
+                    raise AnalysisCancelled()
+                self.paragraph_cache, self.stem_table = paragraph_cache, stem_table
+
+        if metrics.enabled:
+            cache_after = self.stem.cache_info()
+            metrics.count("tokens", result.word_count)
+            metrics.count("paragraphs", len(paragraphs))
+            metrics.count("stem_cache_hits", cache_after.hits - cache_before.hits)
+            metrics.count("stem_cache_misses", cache_after.misses - cache_before.misses)
+        return result
+
+    def stem_positions(self, text):
+        """Номера слов текста по основам: основа -> array('i') номеров по возрастанию.
+
+        Разбор тот же, что в analyze (абзацы, токенизация, стемминг); используется
+        корпусным индексом (corpus_index.py).
+        """
+        stem = self.stem
+        positions = {}
+        offset = 0
+        for paragraph_text in text.split("\n"):
+            words = self.tokenize(paragraph_text, self.language).words
+            for i, word in enumerate(words, offset):
+                stemmed_word = stem(word)
+                word_positions = positions.get(stemmed_word)
+                if word_positions is None:
+                    positions[stemmed_word] = array("i", (i,))
+                else:
+                    word_positions.append(i)
+            offset += len(words)
+        return positions
+
+    def find_phrases(self, text, paragraphs, stem_table):
+        """PhraseInfo повторяющихся фраз по разобранным абзацам, самые частые первыми.
+
+        stem_table — таблица, номерами из которой записаны основы абзацев.
+        """
+        stem_ids = array("i")
+        word_numbers = array("i")  # номер слова в тексте для каждой позиции stem_ids
+        starts = array("i")
+        ends = array("i")
+        word_number = 0
+        for offset, paragraph in paragraphs:
+            tokens = paragraph.tokens
+            stem_ids.extend(paragraph.stem_ids)
+            word_numbers.extend(range(word_number, word_number + len(paragraph.stem_ids)))
+            starts.extend([offset + start for start in tokens.starts])
+            ends.extend([offset + end for end in tokens.ends])
+            word_number += len(paragraph.stem_ids)
+            # Граница абзаца
+            stem_ids.append(-1)
+            word_numbers.append(word_number)
+            starts.append(0)
+            ends.append(0)
+
+        stems = stem_table.stems
+        stop_ids = {stem_table[stem] for stem in self.stemmed_stop_words if stem in stem_table}
+        phrases = []
+        for length, positions in find_repeated_phrases(stem_ids, stop_ids):
+            first = positions[0]
+            phrases.append(PhraseInfo(
+                text = " ".join(text[starts[first]:ends[first + length - 1]].split()),
+                stems = tuple(stems[stem_id] for stem_id in stem_ids[first:first + length]),
+                count = len(positions),
+                min_distance = min(word_numbers[b] - word_numbers[a] for a, b in zip(positions, positions[1:])),
+                starts = array("i", [starts[position] for position in positions]),
+                ends = array("i", [ends[position + length - 1] for position in positions])
+            ))
+        phrases.sort(key=lambda phrase: (-phrase.count, phrase.min_distance))
+        return phrases
+
+    def analyze_file(self, path, encoding="utf-8", chunk_size=STREAM_CHUNK_SIZE, progress=None):
+        """Анализирует файл потоково, не загружая его целиком в память.
+
+        Файл отображается в память через mmap и читается кусками около chunk_size байт,
+        которые всегда заканчиваются на перевод строки: абзац, а значит и предложение,
+        не разрезается. Кодировка должна быть совместима с ASCII (например, UTF-8 или
+        cp1251), чтобы байт перевода строки не встречался внутри символов.
+        Позиции подсветки и фразы не собираются (result.phrases — None);
+        progress(done, total) получает прочитанные байты.
+        """
+        totals = AnalysisAccumulator()
+        stem_table = StemTable()
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size == 0:
+                return totals.result(stem_table.stems, self.stemmed_stop_words)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                position = 0
+                while position < size:
+                    end = data.rfind(b"\n", position, position + chunk_size)
+                    if end == -1:
+                        # Строка длиннее куска: читаем её целиком
+                        end = data.find(b"\n", position + chunk_size)
+                    end = size if end == -1 else end + 1
+                    # Переводы строк приводим к "\n", как read_text() и open() в текстовом режиме
+                    chunk = data[position:end].decode(encoding).replace("\r\n", "\n").replace("\r", "\n")
+                    part = AnalysisAccumulator()
+                    for paragraph_text in chunk.split("\n"):
+                        part.add_paragraph(self.analyze_paragraph(paragraph_text, stem_table))
+                    part.add_chars(chunk)
+                    totals.merge(part)
+                    position = end
+                    if progress is not None:
+                        progress(position, size)
+        return totals.result(stem_table.stems, self.stemmed_stop_words)
+
+
+_worker_analyzer = None  # Свой экземпляр анализатора в каждом процессе пула
+
+
+def init_worker(language="russian", cache_path=None, cache_max_bytes=None, tokenizer="punkt"):
+    """Инициализатор процессов пула (ProcessPoolExecutor): создаёт анализатор процесса.
+
+    Общий для batch_analyze.py, analysis_server.py и corpus_index.py; cache_path — файл
+    AnalysisCache, без него кэш не используется.
+    """
+    global _worker_analyzer
+    cache = None
+    if cache_path:
+        from analysis_cache import CACHE_MAX_BYTES, AnalysisCache
+        cache = AnalysisCache(cache_path, cache_max_bytes or CACHE_MAX_BYTES)
+    _worker_analyzer = TextAnalyzer(language, cache=cache, tokenizer=tokenizer)
+
+
+def worker_analyzer():
+    """Анализатор текущего процесса пула, созданный init_worker."""
+    return _worker_analyzer
@@ -0,0 +1,152 @@
+import heapq
+import tkinter as tk
+
+from tkinter import ttk, font
+from instrumentation import metrics
+
+HEAD_ROWS = 200  # Сколько строк с начала списка готовить частичной сортировкой
+
+SORT_KEYS = {
+    "count": lambda item: -item[1].count,
+    # По минимальному расстоянию, затем по частоте (если расстояния равны)
+    "distance": lambda item: (item[1].min_distance, -item[1].count),
+    # Фразы: по частоте, затем по близости
+    "phrases": lambda item: (-item[1].count, item[1].min_distance),
+}
+
+
+class SortedWords:
+    """Слова в порядке одной сортировки, упорядоченные не больше, чем нужно.
+
+    Пока показывается только начало списка, первые строки выбираются кучей
+    (heapq.nsmallest, O(n log k)); полная сортировка выполняется один раз, когда
+    нужна строка за пределами начала или номер слова, которого там нет.
+    """
+
+    def __init__(self, word_info, key):
+        self.items = list(word_info.items())
+        self.key = key
+        self.head = []
+        self.rows_of_head = {}
+        self.full = None
+        self.rows_of_full = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def rows(self, first, count):
+        """Пары (слово, WordInfo) для строк first..first+count."""
+        end = first + count
+        if self.full is None and end > len(self.head):
+            if not self.head and end * 10 <= len(self.items):
+                # Начало выбирается один раз: строка за его пределами — уже прокрутка, и дальше
+                # одна полная сортировка дешевле, чем nsmallest на каждом шаге.
+                # nsmallest даёт тот же порядок, что sorted(...)[:k], включая равные ключи
+                self.head = heapq.nsmallest(max(end, HEAD_ROWS), self.items, key=self.key)
+                self.rows_of_head = {word: row for row, (word, _) in enumerate(self.head)}
+            else:
+                self.sort_all()
+        if self.full is not None:
+            return self.full[first:end]
+        return self.head[first:end]
+
+    def sort_all(self):
+        if self.full is None:
+            self.full = sorted(self.items, key=self.key)
+            self.rows_of_full = {word: row for row, (word, _) in enumerate(self.full)}
+            self.head = []
+            self.rows_of_head = {}
+
+    def index(self, word):
+        """Номер строки слова или None, если его нет в списке."""
+        row = self.rows_of_head.get(word)
+        if row is not None:
+            return row
+        self.sort_all()
+        return self.rows_of_full.get(word)
+
+
+class VirtualListbox(ttk.Frame):
+    """Список со своей прокруткой, в котором существуют только видимые строки.
+
+    Строки запрашиваются у row_source(first, count) при каждой перерисовке, поэтому
+    длина списка не влияет на число вызовов Tk.
+    """
+
+    def __init__(self, master, **listbox_options):
+        super().__init__(master)
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+        self.listbox = tk.Listbox(self, **listbox_options)
+        self.listbox.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.grid(row=0, column=0, sticky="nse")
+
+        self.row_count = 0
+        self.row_source = lambda first, count: []
+        self.first = 0         # номер первой видимой строки
+        self.selected = None   # номер выделенной строки
+        self.line_height = font.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+
+        self.listbox.bind("<Configure>", lambda event: self.render())
+        self.listbox.bind("<MouseWheel>", self.mouse_wheel)
+        self.listbox.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll(3))
+
+    def set_rows(self, row_count, row_source):
+        self.row_count = row_count
+        self.row_source = row_source
+        self.first = 0
+        self.selected = None
+        self.render()
+
+    def visible_rows(self):
+        return max(1, self.listbox.winfo_height() // self.line_height)
+
+    def render(self):
+        count = self.visible_rows()
+        self.first = max(0, min(self.first, self.row_count - count))
+        rows = self.row_source(self.first, count)
+        self.listbox.delete(0, tk.END)
+        if rows:
+            self.listbox.insert(tk.END, *rows)
+        if self.selected is not None and self.first <= self.selected < self.first + len(rows):
+            self.listbox.selection_set(self.selected - self.first)
+        if self.row_count:
+            self.scrollbar.set(self.first / self.row_count, (self.first + len(rows)) / self.row_count)
+        else:
+            self.scrollbar.set(0, 1)
+        metrics.count("tk_calls", 4)
+
+    def yview(self, *args):
+        # Команды полосы прокрутки: moveto <доля> или scroll <n> units|pages
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * self.row_count)
+            self.render()
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self.scroll(step * self.visible_rows() if args[2] == "pages" else step)
+
+    def scroll(self, rows):
+        self.first += rows
+        self.render()
+        return "break"
+
+    def mouse_wheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def nearest(self, y):
+        return self.first + self.listbox.nearest(y)
+
+    def selection_clear(self):
+        self.selected = None
+        self.listbox.selection_clear(0, tk.END)
+
+    def selection_set(self, row):
+        self.selected = row
+
+    def see(self, row):
+        count = self.visible_rows()
+        if not self.first <= row < self.first + count:
+            self.first = row - count // 2
+        self.render()